@@ -0,0 +1,195 @@
+import machine
+import machine.generate
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+try:
+    from machine import vectorized
+except ImportError:
+    # numpy is optional, the vectorised stage is then skipped
+    vectorized = None
+
+kFAMILY_flag = "--family"
+kSIZES_flag = "--sizes"
+kALPHA_flag = "--alpha"
+kLAMBDA_flag = "--lambda"
+kFANOUT_flag = "--fanout"
+kSEED_flag = "--seed"
+kTAPES_flag = "--tapes"
+kREPEAT_flag = "--repeat"
+kOUT_flag = "--out"
+kBASELINE_flag = "--baseline"
+kTOLERANCE_flag = "--tolerance"
+
+kFAMILY_random = "random"
+kFAMILY_nth = "nth"
+kDEFAULTS = {
+    kFAMILY_flag: kFAMILY_random,
+    kSIZES_flag: "32,64,96,128",
+    kALPHA_flag: "2",
+    kLAMBDA_flag: "0.002",
+    kFANOUT_flag: "1.0",
+    kSEED_flag: "0",
+    kTAPES_flag: "2000",
+    kREPEAT_flag: "5",
+    kTOLERANCE_flag: "0.25",
+}
+# stages faster than this are run back to back until a sample takes this long
+kMIN_SAMPLE = 0.02
+kTIMED = ["config", "t_table", "convert", "exec_dfa", "exec_nfal", "exec_vectorized"]
+
+
+def errmsg(*args, **flags):
+    print(*args, file=sys.stderr, **flags)
+
+
+def parsecommands(argv: List[str]) -> dict:
+    commands = dict(kDEFAULTS)
+    for flag in list(kDEFAULTS) + [kOUT_flag, kBASELINE_flag]:
+        if flag in argv:
+            index = argv.index(flag)
+            try:
+                commands[flag] = argv[index + 1]
+            except IndexError:
+                raise ValueError("missing value", flag)
+    return commands
+
+
+def best_of(repeat: int, fn, setup=None) -> tuple:
+    """
+    each sample runs fn enough times to take kMIN_SAMPLE seconds,
+    so short stages are timed well above timer noise
+
+    :param repeat: number of samples
+    :param fn: callable to time, given the result of setup
+    :param setup: untimed callable run before each run
+    :return: (fastest time per run in seconds, spread of the samples
+        in seconds as median minus fastest, result of the last run)
+    """
+    prepared = setup() if setup else None
+    start = time.perf_counter()
+    result = fn(prepared)
+    number = max(1, int(kMIN_SAMPLE / max(time.perf_counter() - start, 1e-9)) + 1)
+    samples = list()
+    for _ in range(repeat):
+        prepared = [setup() if setup else None for _ in range(number)]
+        start = time.perf_counter()
+        for this_prepared in prepared:
+            result = fn(this_prepared)
+        samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    return samples[0], samples[len(samples) // 2] - samples[0], result
+
+
+def runcase(commands: dict, size: int, workdir: str) -> dict:
+    """
+    generates one machine and corpus, then times each stage
+
+    :param commands: parsed command line
+    :param size: machine size, states for random, n for nth
+    :param workdir: directory for the generated configuration
+    :return: result record
+    """
+    seed = int(commands[kSEED_flag])
+    repeat = int(commands[kREPEAT_flag])
+    case = {"family": commands[kFAMILY_flag], "size": size, "seed": seed}
+    if commands[kFAMILY_flag] == kFAMILY_nth:
+        config = machine.generate.nth_from_end(size)
+    else:
+        case["alpha"] = int(commands[kALPHA_flag])
+        case["lambda"] = float(commands[kLAMBDA_flag])
+        case["fanout"] = float(commands[kFANOUT_flag])
+        config = machine.generate.random_nfal(size, case["alpha"], case["lambda"], case["fanout"], seed=seed)
+    filepath = os.path.join(workdir, "{0}_{1}.nfal".format(case["family"], size))
+    machine.generate.write_config(config, filepath)
+    tapes = list(machine.generate.tape_corpus(config[machine.kALPHA_PREFIX], int(commands[kTAPES_flag]),
+                                              0, 64, seed=seed))
+
+    # each stage gets a freshly configured machine so nothing is cached between runs
+    fresh = lambda: machine.NFAlambda(filepath)
+    spread = case["spread"] = dict()
+    case["config"], spread["config"], _ = best_of(repeat, lambda _: machine.NFAlambda(filepath))
+    case["t_table"], spread["t_table"], _ = best_of(repeat, lambda m: m.t_table(), fresh)
+    case["convert"], spread["convert"], D = best_of(repeat, lambda m: m.convert(), fresh)
+    case["dfa_states"] = len(D.states)
+    compiled = D.compile()
+    case["exec_dfa"], spread["exec_dfa"], accepted = best_of(repeat, lambda _: [compiled.accepts(t) for t in tapes])
+    case["exec_nfal"], spread["exec_nfal"], _ = best_of(repeat, lambda m: [m.accepts(t) for t in tapes], fresh)
+    if vectorized is not None:
+        matrix = vectorized.transition_matrix(compiled)
+        case["exec_vectorized"], spread["exec_vectorized"], batch = \
+            best_of(repeat, lambda _: vectorized.accepts_batch(compiled, tapes, matrix))
+        # tapes the batch run does not decide the way CompiledDFA.accepts does
+        case["vectorized_mismatches"] = sum(a != b for a, b in zip(batch.tolist(), accepted))
+    return case
+
+
+def casekey(case: dict) -> tuple:
+    return tuple(case.get(x) for x in ("family", "size", "seed", "alpha", "lambda", "fanout"))
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    """
+    a stage regresses when it is slower than the baseline by more
+    than the tolerance plus the larger spread of the two runs, so
+    timing noise alone does not fail the gate
+
+    :param results: current result records
+    :param baseline: saved result records
+    :param tolerance: allowed slowdown, 0.25 is 25% slower
+    :return: list of (case, stage, baseline time, current time)
+    """
+    saved = {casekey(case): case for case in baseline}
+    ret = list()
+    for case in results:
+        old = saved.get(casekey(case))
+        if old is None:
+            continue
+        for stage in kTIMED:
+            if stage not in old or stage not in case:
+                continue
+            noise = max(old.get("spread", {}).get(stage, 0), case["spread"][stage])
+            limit = old[stage] * (1 + tolerance) + noise
+            if case[stage] > limit:
+                ret.append((casekey(case), stage, old[stage], case[stage]))
+    return ret
+
+
+if __name__ == "__main__":
+    try:
+        commands = parsecommands(sys.argv)
+        sizes = [int(x) for x in commands[kSIZES_flag].split(",")]
+    except ValueError as e:
+        errmsg("Usage: benchmark [", *kDEFAULTS, kOUT_flag, kBASELINE_flag, "] <value>", e.args)
+        exit(-1)
+
+    results = list()
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            case = runcase(commands, size, workdir)
+            errmsg(json.dumps(case))
+            results.append(case)
+    mismatched = [casekey(case) for case in results if case.get("vectorized_mismatches")]
+    for key in mismatched:
+        errmsg("Mismatch: ", key, "vectorized results differ from CompiledDFA.accepts")
+
+    report = json.dumps({"results": results}, sort_keys=True, indent=4)
+    if kOUT_flag in commands:
+        with open(commands[kOUT_flag], "w+", encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+    if kBASELINE_flag in commands:
+        with open(commands[kBASELINE_flag], encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        slow = regressions(results, baseline, float(commands[kTOLERANCE_flag]))
+        for key, stage, before, after in slow:
+            errmsg("Regression: ", key, stage, "{0:.4f}s -> {1:.4f}s".format(before, after))
+        if slow:
+            exit(1)
+    exit(1 if mismatched else 0)
@@ -1,8 +1,22 @@
+import abc
 import json
-import copy
 import sys
 import os
 import collections
+import collections.abc
+import array
+import codecs
+import mmap
+import contextlib
+import time
+import threading
+import itertools
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is then not reported
+    resource = None
 
 kSTATES_PREFIX = "States"
 kALPHA_PREFIX = "Alphabet"
@@ -13,8 +27,56 @@ kACCEPT_PREFIX = "Accept"
 kEXEC_OUTPUT = "output"
 kEXEC_ACCEPT = "accepted"
 kEXEC_TAPE = "tape"
+kREPORT_GENERATED = "generated"
+kREPORT_REVISITED = "revisited"
+kREPORT_TRANSITIONS = "transitions"
+kREPORT_REUSED = "reused"
 kLAMBA = ""
 kEMPTYSET = "∅"
+kTAPE_CHUNK = 1 << 20
+kSUBSET_CACHE_SIZE = 1 << 16
+kSTAT_PARSE = "config.parse"
+kSTAT_VALIDATE = "config.validate"
+kSTAT_COMPILE = "compile"
+kSTAT_CLOSURE_CALLS = "lambda_closure.calls"
+kSTAT_CLOSURES = "lambda_closure.precomputed"
+kSTAT_CLOSURES_REUSED = "lambda_closure.reused"
+kSTAT_SUBSET_NEW = "subset_cache.created"
+kSTAT_SUBSET_EVICTED = "subset_cache.evicted"
+kSTAT_SUBSET_STEPS = "subset_cache.steps_computed"
+kSTAT_SUBSET_HITS = "subset_cache.hits"
+kSTAT_SUBSET_LOOKUPS = "subset_cache.lookups"
+kSTAT_CONVERT = "convert"
+kSTAT_CONVERT_CREATED = "convert.states_created"
+kSTAT_CONVERT_DEDUPLICATED = "convert.states_deduplicated"
+kSTAT_CONVERT_REUSED = "convert.states_reused"
+kSTAT_MINIMIZE = "minimize"
+kSTAT_EXEC = "exec"
+kSTAT_TRANSITIONS = "exec.transitions"
+kSTAT_RATE = "exec.transitions_per_second"
+kSTAT_PEAK_MEMORY = "peak_memory_kb"
+kTRACE_NONE = 0
+kTRACE_VERDICT = 1
+kTRACE_TAIL = 2
+kTRACE_FULL = 3
+kTRACE_LEVELS = {"none": kTRACE_NONE, "verdict": kTRACE_VERDICT, "tail": kTRACE_TAIL, "full": kTRACE_FULL}
+kTRACE_TAIL_STEPS = 32
+kTRACE_STEP = "step"
+kTRACE_STATE = "state"
+kTRACE_CHAR = "character"
+kTRACE_NEW_STATE = "new_state"
+kTRACE_STEPS = "steps"
+kCOMPACT_MAGIC = "MACHINE"
+kCOMPACT_VERSION = 1
+kCOMPACT_DFA = "dfa"
+kCOMPACT_NFAL = "nfal"
+kCOMPACT_EMPTY = "-"
+# verdict already settled in a state, see CompiledDFA.fixed
+kFIXED_OPEN = 0
+kFIXED_REJECT = 1
+kFIXED_ACCEPT = 2
+# symbols read between checks for a settled verdict
+kVERDICT_BLOCK = 1 << 12
 
 def generateConfigDFA():
     config = dict()
@@ -58,11 +120,405 @@ def testNFAlamba():
     return NFAlambda(filepath=os.path.join(os.path.expanduser("~"), "Desktop", "example.nfal"))
 
 
+class Stats:
+    """
+    counters and timers filled in by machines that were handed
+    a Stats object, a machine without one skips the bookkeeping
+    (it is done per call or per tape chunk, never per symbol)
+
+    one Stats may be shared by machines running on several threads
+    """
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.timers = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            self.timers[name] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def report(self) -> dict:
+        """
+        :return: counters, timers and the derived rates as a dict
+        """
+        ret = dict(self.counters)
+        ret.update(self.timers)
+        if self.counters[kSTAT_SUBSET_LOOKUPS]:
+            ret[kSTAT_SUBSET_HITS] = self.counters[kSTAT_SUBSET_LOOKUPS] - self.counters[kSTAT_SUBSET_STEPS]
+        if self.timers.get(kSTAT_EXEC):
+            ret[kSTAT_RATE] = self.counters[kSTAT_TRANSITIONS] / self.timers[kSTAT_EXEC]
+        if resource is not None:
+            ret[kSTAT_PEAK_MEMORY] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return ret
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_no_timer = _NoTimer()
+
+
+def _timer(stats: Stats, name: str):
+    return _no_timer if stats is None else stats.timer(name)
+
+
+def _chunks(tape):
+    """
+    :param tape: str, Tape or any iterable of symbols
+    :return: the chunks of a Tape, or the tape as its only chunk
+    """
+    return tape.chunks() if isinstance(tape, Tape) else (tape,)
+
+
+def _bits(mask: int):
+    """
+    :param mask: bitmask of states
+    :return: generator of the indices of the set bits, lowest first
+    """
+    # one pass over the binary digits, clearing bits one at a
+    # time copies the whole integer for every bit of a wide mask
+    digits = bin(mask)[:1:-1]
+    i = digits.find("1")
+    while i >= 0:
+        yield i
+        i = digits.find("1", i + 1)
+
+
+def _blocks(chunk):
+    """
+    :param chunk: run of symbols from a tape, or any iterable of them
+    :return: the chunk in slices of kVERDICT_BLOCK symbols, an
+        iterable that cannot be sliced is taken a list of that many
+        symbols at a time, so every block has a length
+    """
+    if isinstance(chunk, (str, bytes, list, tuple)):
+        return (chunk[i:i + kVERDICT_BLOCK] for i in range(0, len(chunk), kVERDICT_BLOCK))
+    return _iter_blocks(iter(chunk))
+
+
+def _check_symbols(block, alphabet):
+    """
+    the rest of a tape whose verdict is already fixed is not run
+    but still checked, so the verdict does not depend on how far
+    a run went
+
+    :param block: symbols not run
+    :param alphabet: set or dict keyed on the valid symbols
+    """
+    if set(block).difference(alphabet):
+        for char in block:
+            if char not in alphabet:
+                raise InvalidCharacterInTape(char)
+
+
+def _iter_blocks(symbols):
+    while True:
+        block = list(itertools.islice(symbols, kVERDICT_BLOCK))
+        if not block:
+            return
+        yield block
+
+
+def _fixed_verdicts(table, width: int, accept) -> bytes:
+    """
+    dead state and accept sink analysis, a state is kFIXED_REJECT
+    when no accepting state can be reached from it and kFIXED_ACCEPT
+    when no rejecting state can, either way every tape read from
+    there on gets the same verdict
+
+    :param table: table[state * width + class]
+    :param width: columns per state
+    :param accept: one byte per state, 1 when accepting
+    :return: one byte per state, kFIXED_OPEN, kFIXED_REJECT or kFIXED_ACCEPT
+    """
+    n = len(accept)
+    predecessors = [[] for _ in range(n)]
+    for i, q in enumerate(table):
+        predecessors[q].append(i // width)
+    ret = bytearray(n)
+    for verdict, other in ((kFIXED_REJECT, 1), (kFIXED_ACCEPT, 0)):
+        # states that can still reach a state with the other verdict
+        reach = bytearray(n)
+        stack = [q for q in range(n) if accept[q] == other]
+        for q in stack:
+            reach[q] = 1
+        while stack:
+            for p in predecessors[stack.pop()]:
+                if not reach[p]:
+                    reach[p] = 1
+                    stack.append(p)
+        for q in range(n):
+            if not reach[q]:
+                ret[q] = verdict
+    return bytes(ret)
+
+
+def _symbol_classes(symbols: list, column_of: dict) -> tuple:
+    """
+    :param symbols: alphabet, sorted
+    :param column_of: symbol to its class index
+    :return: the classes, each a tuple of its symbols, in class order
+    """
+    classes = collections.defaultdict(list)
+    for a in symbols:
+        classes[column_of[a]].append(a)
+    return tuple(tuple(classes[i]) for i in range(len(classes)))
+
+
+def _merge_columns(symbol_map: dict, table: array.array, width: int) -> tuple:
+    """
+    alphabet compression, columns of the table that are the same
+    for every state are merged into one class of symbols
+
+    :param symbol_map: symbol to its column of the table
+    :param table: table[state * width + column]
+    :param width: columns per state
+    :return: (symbol to class map, table[state * classes + class],
+        number of classes)
+    """
+    seen = dict()
+    columns = list()
+    remap = list()
+    for c in range(width):
+        remap.append(seen.setdefault(table[c::width].tobytes(), len(columns)))
+        if remap[c] == len(columns):
+            columns.append(c)
+    symbol_map = {a: remap[c] for a, c in symbol_map.items()}
+    if len(columns) == width:
+        return symbol_map, table, width
+    merged = array.array("i", [0]) * (len(table) // width * len(columns))
+    for i, c in enumerate(columns):
+        merged[i::len(columns)] = table[c::width]
+    return symbol_map, merged, len(columns)
+
+
+def _select(steps, verbosity: int, tail: int):
+    """
+    passes on the step records a verbosity level asks for, all of
+    them or only the last few kept in a ring buffer
+
+    :return: the final state returned by the steps generator
+    """
+    if verbosity >= kTRACE_FULL:
+        return (yield from steps)
+    buffer = collections.deque(maxlen=tail)
+    while True:
+        try:
+            buffer.append(next(steps))
+        except StopIteration as e:
+            state = e.value
+            break
+    yield from buffer
+    return state
+
+
+def _step_record(step: int, state, char: str, new_state) -> dict:
+    return {kTRACE_STEP: step, kTRACE_STATE: state, kTRACE_CHAR: char, kTRACE_NEW_STATE: new_state}
+
+
+def _verdict_record(accepted: bool, state, steps: int, tape) -> dict:
+    return {kEXEC_ACCEPT: accepted, kTRACE_STATE: state, kTRACE_STEPS: steps, kEXEC_TAPE: str(tape)}
+
+
+def format_trace(record: dict) -> str:
+    """
+    :param record: step or verdict record from a trace
+    :return: the record as a line of the human readable trace
+    """
+    if kEXEC_ACCEPT in record:
+        verdict = "accepted" if record[kEXEC_ACCEPT] else "rejected"
+        return "{0} {1}, state: {2}\n".format(verdict, record[kEXEC_TAPE], record[kTRACE_STATE])
+    return "state: {0}, character: {1}, new state: {2}\n".format(
+        record[kTRACE_STATE], record[kTRACE_CHAR], record[kTRACE_NEW_STATE])
+
+
+def write_trace(records, f):
+    """
+    streams trace records to a file as JSON lines
+
+    :param records: iterable of records, e.g. from a trace() generator
+    :param f: text file to write to
+    """
+    for record in records:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _exec_result(machine: "Machine", records, verbosity: int, exec_start: float) -> dict:
+    """
+    gathers a trace into the dict returned by exec, the output
+    holds only the lines the verbosity level asked for
+    """
+    ret = dict()
+    output = list()
+    for record in records:
+        if kEXEC_ACCEPT in record:
+            ret[kEXEC_ACCEPT] = record[kEXEC_ACCEPT]
+            ret[kEXEC_TAPE] = record[kEXEC_TAPE]
+            machine.current_state = record[kTRACE_STATE]
+            machine.current_position = record[kTRACE_STEPS]
+            if verbosity == kTRACE_NONE:
+                continue
+        output.append(format_trace(record))
+    ret[kEXEC_OUTPUT] = "".join(output)
+    if machine.stats is not None:
+        machine.stats.count(kSTAT_TRANSITIONS, machine.current_position)
+        machine.stats.add_time(kSTAT_EXEC, time.perf_counter() - exec_start)
+    return ret
+
+
+def compact_kind(filepath) -> str:
+    """
+    :param filepath: configuration file
+    :return: kCOMPACT_DFA or kCOMPACT_NFAL for a compact
+        configuration, None for anything else
+    """
+    with open(filepath, encoding='utf-8') as f:
+        magic = f.readline(64).split()
+    if len(magic) == 3 and magic[0] == kCOMPACT_MAGIC:
+        return magic[1]
+    return None
+
+
+def _compact_field(f, name: str) -> str:
+    line = f.readline()
+    key, _, value = line.rstrip("\n").partition(" ")
+    if key != name:
+        raise MissingConfigBlock(name)
+    return value
+
+
+def _read_compact(filepath, kind: str) -> tuple:
+    """
+    streaming reader for the compact format, each row is checked
+    as it is read and only the integer rows are kept
+
+    :param filepath: compact configuration
+    :param kind: kCOMPACT_DFA or kCOMPACT_NFAL
+    :return: (labels, alphabet, rows, start index, accept indices),
+        rows is a flat array of targets for a DFA and a list of
+        tuples of target tuples for an NFA-lambda
+    """
+    with open(filepath, encoding='utf-8') as f:
+        magic = f.readline().split()
+        if magic != [kCOMPACT_MAGIC, kind, str(kCOMPACT_VERSION)]:
+            raise InvalidConfigBlock(kCOMPACT_MAGIC, magic)
+        try:
+            alpha = json.loads(_compact_field(f, kALPHA_PREFIX))
+            if not alpha or len(alpha) != len(set(alpha)):
+                raise InvalidConfigBlock(kALPHA_PREFIX, alpha)
+            n = int(_compact_field(f, kSTATES_PREFIX))
+            start = int(_compact_field(f, kSTART_PREFIX))
+            if not 0 <= start < n:
+                raise InvalidConfigBlock(kSTART_PREFIX, start)
+            accept = [int(x) for x in _compact_field(f, kACCEPT_PREFIX).split()]
+            if any(not 0 <= q < n for q in accept):
+                raise InvalidConfigBlock(kACCEPT_PREFIX, accept)
+        except ValueError as e:
+            raise InvalidConfigBlock(kCOMPACT_MAGIC, *e.args)
+
+        k = len(alpha)
+        labels = list()
+        seen = set()
+        rows = array.array("i") if kind == kCOMPACT_DFA else list()
+        for i in range(n):
+            line = f.readline()
+            if not line:
+                raise MissingConfigBlock(kDTABLE_PREFIX, i)
+            label, _, targets = line.rstrip("\n").partition("\t")
+            try:
+                if len(label) > 1 and label[0] == label[-1] == '"' and "\\" not in label:
+                    # nothing escaped, skip the JSON decoder
+                    label = label[1:-1]
+                else:
+                    label = json.loads(label)
+                fields = targets.split(" ")
+                if len(fields) != k or label in seen:
+                    raise ValueError(line)
+                if kind == kCOMPACT_DFA:
+                    row = [int(x) for x in fields]
+                    if min(row) < 0 or max(row) >= n:
+                        raise ValueError(line)
+                    rows.extend(row)
+                else:
+                    row = tuple(() if x == kCOMPACT_EMPTY else tuple(int(y) for y in x.split(",")) for x in fields)
+                    if any(not 0 <= t < n for targets in row for t in targets):
+                        raise ValueError(line)
+                    rows.append(row)
+            except ValueError:
+                raise InvalidConfigBlock(kDTABLE_PREFIX, i, line)
+            labels.append(label)
+            seen.add(label)
+    return labels, alpha, rows, start, accept
+
+
+def _write_compact(f, kind: str, labels: list, alpha: list, start: int, accept: list, rows):
+    """
+    :param f: text file to write to
+    :param kind: kCOMPACT_DFA or kCOMPACT_NFAL
+    :param labels: state names, in row order
+    :param alpha: symbols, in column order
+    :param start: index of the start state
+    :param accept: indices of the accepting states
+    :param rows: iterable of one list of target fields per state
+    """
+    f.write("{0} {1} {2}\n".format(kCOMPACT_MAGIC, kind, kCOMPACT_VERSION))
+    f.write("{0} {1}\n".format(kALPHA_PREFIX, json.dumps(alpha, ensure_ascii=False)))
+    f.write("{0} {1}\n".format(kSTATES_PREFIX, len(labels)))
+    f.write("{0} {1}\n".format(kSTART_PREFIX, start))
+    f.write("{0} {1}\n".format(kACCEPT_PREFIX, " ".join(str(q) for q in sorted(accept))))
+    for label, row in zip(labels, rows):
+        f.write("{0}\t{1}\n".format(json.dumps(label, ensure_ascii=False), " ".join(row)))
+
+
+def load_compiled(filepath, stats: Stats = None) -> "CompiledDFA":
+    """
+    compiles a compact DFA configuration straight from the file,
+    the transitions go into the flat table without ever being
+    held as dicts
+
+    :param filepath: compact DFA configuration
+    :param stats: collects the parse time and the runs' counters
+    :return: CompiledDFA
+    """
+    with _timer(stats, kSTAT_PARSE):
+        labels, alpha, table, start, accept = _read_compact(filepath, kCOMPACT_DFA)
+    ret = CompiledDFA()
+    ret.stats = stats
+    ret.state_labels = labels
+    ret.symbols = alpha
+    ret.symbol_map, ret.table, _ = _merge_columns({a: i for i, a in enumerate(alpha)}, table, len(alpha))
+    ret.classes = _symbol_classes(alpha, ret.symbol_map)
+    ret.start = start
+    flags = bytearray(len(labels))
+    for q in accept:
+        flags[q] = 1
+    ret.accept = bytes(flags)
+    return ret.freeze()
+
+
 class Machine:
-    def __init__(self, filepath=None):
+    def __init__(self, filepath=None, stats: Stats = None):
         self.current_state = None
         self.current_position = 0
         self.loaded_tape = None
+        self.stats = stats
         try:
             if filepath:
                 self.config(filepath)
@@ -104,22 +560,59 @@ class Machine:
 
 
 class DFA(Machine):
-    def __init__(self, filepath=None):
+    def __init__(self, filepath=None, stats: Stats = None):
         self.states = None
         self.alpha = None
         self.d_table = None
         self.start = None
         self.accept = None
-        super().__init__(filepath)
+        # readable names of the states, None when the states are their own names
+        self.label_map = None
+        self._fixed: dict = None
+        self._compiled: "CompiledDFA" = None
+        super().__init__(filepath, stats)
+
+    def label(self, state) -> str:
+        """
+        :param state: state of this machine
+        :return: its readable name, made through the label map
+            for converted machines whose states are integers
+        """
+        return state if self.label_map is None else self.label_map[state]
+
+    def order(self) -> list:
+        """
+        :return: the states, start state first, in the order
+            compiled forms and compact exports number them
+        """
+        return [self.start] + sorted(self.states.difference({self.start}))
+
+    def fixed(self) -> dict:
+        """
+        states whose verdict can no longer change, worked out once
+        per configuration, see CompiledDFA.fixed
+
+        :return: dict, state to kFIXED_OPEN, kFIXED_REJECT or kFIXED_ACCEPT
+        """
+        if self._fixed is None:
+            self._fixed = dict(zip(self.order(), self.compile().fixed()))
+        return self._fixed
 
     def config(self, filepath):
+        self._fixed = None
+        self._compiled = None
+        self.label_map = None
+        if compact_kind(filepath) is not None:
+            return self.__config_compact(filepath)
 
         file_exists = False
 
         # open filepath
         with open(filepath, encoding='utf-8') as f:
             file_exists = True
-            configuration = json.load(f)
+            with _timer(self.stats, kSTAT_PARSE):
+                configuration = json.load(f)
+            validate_start = time.perf_counter()
 
             # validate config
             config_valid = True
@@ -195,24 +688,47 @@ class DFA(Machine):
             # configure DFA
 
             # set states
-            self.states = copy.deepcopy(states)
+            self.states = states
 
             # set alpha
-            self.alpha = copy.deepcopy(alpha)
+            self.alpha = alpha
 
             # set d-table
-            self.d_table = copy.deepcopy(d_table)
+            self.d_table = d_table
 
             # set starting-state
-            self.start = copy.deepcopy(start)
+            self.start = start
 
             # set accepting-states
-            self.accept = copy.deepcopy(accept)
+            self.accept = accept
+            if self.stats is not None:
+                self.stats.add_time(kSTAT_VALIDATE, time.perf_counter() - validate_start)
         if not file_exists:
             raise FileNotFoundError
 
+    def __config_compact(self, filepath):
+        with _timer(self.stats, kSTAT_PARSE):
+            labels, alpha, table, start, accept = _read_compact(filepath, kCOMPACT_DFA)
+        # states are the row numbers over the flat table, as for a
+        # converted machine, and named through the label map
+        symbol_map, table, _ = _merge_columns({a: j for j, a in enumerate(alpha)}, table, len(alpha))
+        self.states = set(range(len(labels)))
+        self.alpha = set(alpha)
+        self.d_table = TableRows(_symbol_classes(sorted(alpha), symbol_map), table)
+        self.start = start
+        self.accept = set(accept)
+        self.label_map = labels
+
     def __config(self) -> dict:
         config = {}
+        if self.label_map is not None:
+            names = {q: self.label(q) for q in self.states}
+            config[kSTATES_PREFIX] = list(names.values())
+            config[kALPHA_PREFIX] = list(self.alpha)
+            config[kDTABLE_PREFIX] = {names[q]: {a: names[p] for a, p in row.items()} for q, row in self.d_table.items()}
+            config[kSTART_PREFIX] = names[self.start]
+            config[kACCEPT_PREFIX] = [names[q] for q in self.accept]
+            return config
         config[kSTATES_PREFIX] = list(self.states)
         config[kALPHA_PREFIX] = list(self.alpha)
         config[kDTABLE_PREFIX] = self.d_table
@@ -220,58 +736,531 @@ class DFA(Machine):
         config[kACCEPT_PREFIX] = list(self.accept)
         return config
 
-    def export(self, filepath):
+    def export(self, filepath, compact: bool = False):
+        """
+        :param filepath: destination
+        :param compact: write the compact format, one row of target
+            indices per state, instead of JSON
+        """
         # generate a config
         with open(filepath, "w+", encoding='utf-8') as f:
-            json.dump(self.__config(), f, sort_keys=True, indent=4, ensure_ascii=False)
-        pass
+            if compact:
+                order = self.order()
+                index = {q: i for i, q in enumerate(order)}
+                alpha = sorted(self.alpha)
+                rows = ([str(index[self.d_table[q][a]]) for a in alpha] for q in order)
+                _write_compact(f, kCOMPACT_DFA, [self.label(q) for q in order], alpha, 0,
+                               [index[q] for q in self.accept], rows)
+            else:
+                json.dump(self.__config(), f, sort_keys=True, indent=4, ensure_ascii=False)
 
     def dumps(self) -> str:
         return json.dumps(self.__config(), sort_keys=True, indent=4, ensure_ascii=False)
 
-    def exec(self) -> dict:
-        self.current_state = self.start
-        self.current_position = 0
-        ret = dict()
-        output = ""
+    def exec(self, verbosity: int = kTRACE_FULL, tail: int = kTRACE_TAIL_STEPS) -> dict:
+        """
+        runs the loaded tape
+
+        :param verbosity: kTRACE_NONE, kTRACE_VERDICT, kTRACE_TAIL or kTRACE_FULL
+        :param tail: steps kept at kTRACE_TAIL
+        :return: dict with accepted, output and tape entries
+        """
+        exec_start = time.perf_counter()
+        records = self.trace(None, max(verbosity, kTRACE_VERDICT), tail)
+        return _exec_result(self, records, verbosity, exec_start)
+
+    def trace(self, tape=None, verbosity: int = kTRACE_FULL, tail: int = kTRACE_TAIL_STEPS):
+        """
+        lazy execution trace, one record per step and a closing
+        verdict record. Below kTRACE_TAIL no step records are made
+        and the run stops once it enters a state whose verdict is
+        fixed, the rest of the tape is then only checked for
+        invalid characters and the verdict record gives that state
+        and the steps taken to reach it
+
+        :param tape: tape to run, defaults to the loaded tape
+        :param verbosity: kTRACE_NONE, kTRACE_VERDICT, kTRACE_TAIL or kTRACE_FULL
+        :param tail: steps kept at kTRACE_TAIL
+        :return: generator of dict records
+        """
+        tape = self.loaded_tape if tape is None else tape
+        steps = 0
         try:
-            while True:
-                char = self.loaded_tape.read(self.current_position)
-                output += "state: {0}, ".format(self.current_state)
-                output += "character: {0}, ".format(char)
-                self.current_state = self.d_table[self.current_state][self.loaded_tape.read(self.current_position)]
-                output += "new state: {0}\n".format(self.current_state)
-                self.current_position += 1
-        except IndexError as e:
-            if self.current_state in self.accept:
-                output += "accepted {1}, state: {0}\n".format(self.current_state, str(self.loaded_tape))
-                ret[kEXEC_ACCEPT] = True
+            if verbosity >= kTRACE_TAIL:
+                state, steps = yield from _select(self.__steps(tape), verbosity, tail)
             else:
-                output += "rejected {1}, state: {0}\n".format(self.current_state, str(self.loaded_tape))
-                ret[kEXEC_ACCEPT] = False
+                fixed = self.fixed()
+                state = self.start
+                for char in tape:
+                    if fixed[state]:
+                        if char not in self.alpha:
+                            raise InvalidCharacterInTape(char)
+                        continue
+                    state = self.d_table[state][char]
+                    steps += 1
         except KeyError as e:
-            output = "rejected {0}, invalid character on tape: {1}\n".format(str(self.loaded_tape), e)
             raise InvalidCharacterInTape(*e.args)
+        if verbosity >= kTRACE_VERDICT:
+            yield _verdict_record(state in self.accept, self.label(state), steps, tape)
+
+    def __steps(self, tape):
+        label = self.label
+        state = self.start
+        steps = 0
+        for char in tape:
+            new_state = self.d_table[state][char]
+            yield _step_record(steps, label(state), char, label(new_state))
+            state = new_state
+            steps += 1
+        return state, steps
+
+    def runner(self, encoding: str = None) -> "CompiledRunner":
+        """
+        :param encoding: see Runner
+        :return: incremental runner over the compiled machine
+        """
+        return self.compile().runner(encoding)
+
+    def compile(self) -> "CompiledDFA":
+        """
+        builds the integer indexed form of the machine, once per
+        configuration like fixed(). It is frozen, so every runner
+        and caller shares it
+
+        :return: CompiledDFA for this machine
+        """
+        if self._compiled is None:
+            with _timer(self.stats, kSTAT_COMPILE):
+                self._compiled = CompiledDFA(self)
+        return self._compiled
+
+    def minimize(self) -> "DFA":
+        """
+        Hopcroft partition refinement, O(n log n) in the number of
+        states. Unreachable states are dropped first, each block of
+        equivalent states is named after its smallest member (the
+        start state names its own block)
+
+        :return: minimal DFA accepting the same language
+        """
+        with _timer(self.stats, kSTAT_MINIMIZE):
+            return self.__minimize()
+
+    def __minimize(self) -> "DFA":
+        compiled = self.compile()
+        table = compiled.table
+        k = len(compiled.classes)
+
+        # reachable states only
+        reachable = [compiled.start]
+        seen = {compiled.start}
+        for q in reachable:
+            for a in range(k):
+                p = table[q * k + a]
+                if p not in seen:
+                    seen.add(p)
+                    reachable.append(p)
+
+        # inverse transitions
+        inverse = [collections.defaultdict(list) for _ in range(k)]
+        for q in reachable:
+            for a in range(k):
+                inverse[a][table[q * k + a]].append(q)
+
+        # initial partition, accepting and rejecting
+        blocks = [set(q for q in reachable if compiled.accept[q]),
+                  set(q for q in reachable if not compiled.accept[q])]
+        blocks = [b for b in blocks if b]
+        block_of = dict()
+        for i, block in enumerate(blocks):
+            for q in block:
+                block_of[q] = i
+        waiting = {min(range(len(blocks)), key=lambda i: len(blocks[i]))}
+
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+            for a in range(k):
+                # states that move into the splitter on a, by block
+                touched = collections.defaultdict(set)
+                for q in splitter:
+                    for p in inverse[a].get(q, ()):
+                        touched[block_of[p]].add(p)
+                for b, inside in touched.items():
+                    block = blocks[b]
+                    if len(inside) == len(block):
+                        continue
+                    # the smaller half becomes the new block
+                    if 2 * len(inside) <= len(block):
+                        block -= inside
+                        new_block = inside
+                    else:
+                        new_block = block - inside
+                        blocks[b] = inside
+                    blocks.append(new_block)
+                    for q in new_block:
+                        block_of[q] = len(blocks) - 1
+                    waiting.add(len(blocks) - 1)
+
+        # name each block and build the quotient machine
+        order = self.order()
+        names = list()
+        for block in blocks:
+            if compiled.start in block:
+                names.append(order[compiled.start])
+            else:
+                names.append(min(order[q] for q in block))
+        Mprime = DFA(stats=self.stats)
+        Mprime.label_map = self.label_map
+        Mprime.alpha = set(self.alpha)
+        Mprime.start = order[compiled.start]
+        Mprime.states = set(names)
+        Mprime.accept = set()
+        Mprime.d_table = dict()
+        for i, block in enumerate(blocks):
+            q = next(iter(block))
+            Mprime.d_table[names[i]] = {this_char: names[block_of[table[q * k + a]]]
+                                        for this_char, a in compiled.symbol_map.items()}
+            if compiled.accept[q]:
+                Mprime.accept.add(names[i])
+        return Mprime
+
+
+class CompiledDFA:
+    """
+    integer indexed form of a DFA, states and symbols are
+    mapped to dense ints and the transitions are kept in one
+    flat array, table[state * len(classes) + symbol_map[char]]
+
+    symbols whose columns are the same for every state share one
+    class, so the table holds a column per class rather than per
+    symbol and a step is still a single lookup
+
+    the table may be an array or a memoryview over a mapped
+    file, see machine.binary
+
+    once frozen the machine cannot be changed and keeps no run
+    state, so one instance can serve any number of threads at
+    once; per run state lives in runners, see runner()
+    """
+    def __init__(self, dfa: DFA = None):
+        self.state_labels: list = None
+        self.symbols: list = None
+        self.classes: tuple = None
+        self.symbol_map: dict = None
+        self.table = None
+        self.start: int = 0
+        self.accept = None
+        self.stats: Stats = None
+        if dfa is None:
+            return
+        self.stats = dfa.stats
+        # start state is always index 0
+        order = dfa.order()
+        self.symbols = sorted(dfa.alpha)
+        if isinstance(dfa.d_table, TableRows) and dfa.d_table.symbols == self.symbols and \
+                order == list(range(len(order))):
+            # converted machine, already numbered and laid out by class
+            self.state_labels = dfa.label_map if dfa.label_map is not None else order
+            symbol_map, table, width = dfa.d_table.symbol_map, array.array("i", dfa.d_table.table), \
+                len(dfa.d_table.classes)
+        else:
+            self.state_labels = [dfa.label(q) for q in order]
+            state_map = {q: i for i, q in enumerate(order)}
+            symbol_map, width = {a: i for i, a in enumerate(self.symbols)}, len(self.symbols)
+            table = array.array("i", [0]) * (len(order) * width)
+            for this_state, i in state_map.items():
+                row = dfa.d_table[this_state]
+                for this_char, j in symbol_map.items():
+                    table[i * width + j] = state_map[row[this_char]]
+        self.symbol_map, self.table, _ = _merge_columns(symbol_map, table, width)
+        self.classes = _symbol_classes(self.symbols, self.symbol_map)
+        self.accept = bytes(1 if q in dfa.accept else 0 for q in order)
+        self.freeze()
+
+    def freeze(self) -> "CompiledDFA":
+        """
+        makes the machine read only, the table becomes a read only
+        view and the attributes can no longer be set. The symbol map
+        stays a plain dict, a mapping proxy slows down every step,
+        and must not be changed. Called by every constructor and
+        loader once the machine is filled in
+
+        :return: the machine
+        """
+        if isinstance(self.table, array.array):
+            self.table = memoryview(self.table.tobytes()).cast("i")
+        if isinstance(self.symbols, list):
+            self.symbols = tuple(self.symbols)
+        if isinstance(self.state_labels, list):
+            self.state_labels = tuple(self.state_labels)
+        if isinstance(self.accept, bytearray):
+            self.accept = bytes(self.accept)
+        object.__setattr__(self, "_frozen", True)
+        return self
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get("_frozen"):
+            raise FrozenMachine(name)
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        # mapped buffers are copied out so the machine can be pickled
+        state = dict(self.__dict__)
+        state["table"] = array.array("i", self.table)
+        state["state_labels"] = list(self.state_labels)
+        state["symbols"] = list(self.symbols)
+        state["classes"] = tuple(tuple(x) for x in self.classes)
+        state["symbol_map"] = dict(self.symbol_map)
+        state["accept"] = bytes(self.accept)
+        state["stats"] = None
+        state.pop("_frozen", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.freeze()
+
+    def export(self, filepath, compact: bool = False):
+        """
+        writes the machine out as a DFA configuration, the same one
+        DFA.export writes for the machine it was compiled from
+
+        :param filepath: destination
+        :param compact: write the compact format instead of JSON
+        """
+        k = len(self.classes)
+        n = len(self.accept)
+        labels = [self.state_labels[q] for q in range(n)]
+        columns = [self.symbol_map[a] for a in self.symbols]
+        accept = [q for q in range(n) if self.accept[q] == 1]
+        with open(filepath, "w+", encoding='utf-8') as f:
+            if compact:
+                rows = ([str(self.table[q * k + b]) for b in columns] for q in range(n))
+                _write_compact(f, kCOMPACT_DFA, labels, list(self.symbols), self.start, accept, rows)
+                return
+            config = dict()
+            config[kSTATES_PREFIX] = labels
+            config[kALPHA_PREFIX] = list(self.symbols)
+            config[kDTABLE_PREFIX] = {labels[q]: {a: labels[self.table[q * k + b]] for a, b in zip(self.symbols, columns)}
+                                      for q in range(n)}
+            config[kSTART_PREFIX] = labels[self.start]
+            config[kACCEPT_PREFIX] = [labels[q] for q in accept]
+            json.dump(config, f, sort_keys=True, indent=4, ensure_ascii=False)
+
+    def fixed(self) -> bytes:
+        """
+        states whose verdict can no longer change: dead states,
+        like the ∅ state of a converted machine, from which no
+        accepting state can be reached, and accept sinks from
+        which no rejecting state can. Worked out the first time
+        it is asked for and kept
+
+        :return: one byte per state, kFIXED_OPEN, kFIXED_REJECT or kFIXED_ACCEPT
+        """
+        fixed = self.__dict__.get("_fixed")
+        if fixed is None:
+            fixed = _fixed_verdicts(self.table, len(self.classes), self.accept)
+            # a cache, not a change to the machine
+            object.__setattr__(self, "_fixed", fixed)
+        return fixed
+
+    def run(self, tape) -> int:
+        """
+        runs the tape without building a trace
+
+        :param tape: str, Tape or any iterable of symbols
+        :return: index of the final state
+        """
+        return self._run(tape)[0]
+
+    def _run(self, tape, stop: bool = False) -> tuple:
+        exec_start = time.perf_counter()
+        state, steps = self._walk(tape, stop)
+        if self.stats is not None:
+            self.stats.count(kSTAT_TRANSITIONS, steps)
+            self.stats.add_time(kSTAT_EXEC, time.perf_counter() - exec_start)
+        return state, steps
+
+    def _walk(self, tape, stop: bool = False) -> tuple:
+        """
+        :param stop: leave off once the run is in a state whose
+            verdict is fixed, checked every kVERDICT_BLOCK symbols
+        :return: (state, steps), where the run ended
+        """
+        table = self.table
+        symbol_map = self.symbol_map
+        k = len(self.classes)
+        fixed = self.fixed() if stop else None
+        state = self.start
+        steps = 0
+        chunks = _chunks(tape)
+        try:
+            for chunk in chunks:
+                for block in _blocks(chunk):
+                    if stop and fixed[state]:
+                        _check_symbols(block, symbol_map)
+                        continue
+                    for char in block:
+                        state = table[state * k + symbol_map[char]]
+                    steps += len(block)
+        except KeyError as e:
+            raise InvalidCharacterInTape(*e.args)
+        return state, steps
+
+    def accepts(self, tape) -> bool:
+        """
+        accept-only run mode, no trace is produced. The run stops
+        early once its verdict is fixed, see fixed(), the rest of
+        the tape is then only checked for invalid characters
+
+        :param tape: str, Tape or any iterable of symbols
+        :return: True if the machine accepts the tape
+        """
+        return self.accept[self._run(tape, True)[0]] == 1
+
+    def runner(self, encoding: str = None) -> "CompiledRunner":
+        """
+        :param encoding: see Runner
+        :return: incremental runner, fed the tape a chunk at a time
+        """
+        return CompiledRunner(self, encoding)
+
+    def state_map(self, tape, starts: list = None) -> list:
+        """
+        runs the tape from several states at once, runs that land
+        on the same state are merged so once they all agree the
+        rest of the tape costs a single run
+
+        :param tape: str, Tape or any iterable of symbols
+        :param starts: state indices to start from, defaults to all
+        :return: list, entry i is the state reached from starts[i]
+        """
+        table = self.table
+        symbol_map = self.symbol_map
+        k = len(self.classes)
+        if starts is None:
+            starts = range(len(self.state_labels))
+        # distinct states being run, and which of them each start follows
+        active = sorted(set(starts))
+        slot = {q: i for i, q in enumerate(active)}
+        follows = [slot[q] for q in starts]
+        chunks = _chunks(tape)
+        try:
+            for chunk in chunks:
+                chars = iter(chunk)
+                if len(active) > 1:
+                    for char in chars:
+                        a = symbol_map[char]
+                        active = [table[q * k + a] for q in active]
+                        merged = set(active)
+                        if len(merged) < len(active):
+                            slot = {q: i for i, q in enumerate(merged)}
+                            follows = [slot[active[i]] for i in follows]
+                            active = list(merged)
+                            if len(active) == 1:
+                                break
+                if len(active) == 1:
+                    # every run agrees, finish the chunk with a single one
+                    state = active[0]
+                    for char in chars:
+                        state = table[state * k + symbol_map[char]]
+                    active[0] = state
+        except KeyError as e:
+            raise InvalidCharacterInTape(*e.args)
+        return [active[i] for i in follows]
+
+    def exec(self, tape, verbosity: int = kTRACE_FULL, tail: int = kTRACE_TAIL_STEPS) -> dict:
+        """
+        traced run, same result layout as DFA.exec
+
+        :param tape: str or Tape
+        :param verbosity: kTRACE_NONE, kTRACE_VERDICT, kTRACE_TAIL or kTRACE_FULL
+        :param tail: steps kept at kTRACE_TAIL
+        :return: dict with accepted, output and tape entries
+        """
+        exec_start = time.perf_counter()
+        records = self.trace(tape, max(verbosity, kTRACE_VERDICT), tail)
+        return _exec_result(_CompiledRun(self.stats), records, verbosity, exec_start)
+
+    def trace(self, tape, verbosity: int = kTRACE_FULL, tail: int = kTRACE_TAIL_STEPS):
+        """
+        lazy execution trace labelled with the DFA state names,
+        see DFA.trace. Below kTRACE_TAIL the run stops early like
+        accepts, checking every kVERDICT_BLOCK symbols
+
+        :param tape: str, Tape or any iterable of symbols
+        :param verbosity: kTRACE_NONE, kTRACE_VERDICT, kTRACE_TAIL or kTRACE_FULL
+        :param tail: steps kept at kTRACE_TAIL
+        :return: generator of dict records
+        """
+        if verbosity >= kTRACE_TAIL:
+            state, steps = yield from _select(self.__steps(tape), verbosity, tail)
+        else:
+            state, steps = self._walk(tape, True)
+        if verbosity >= kTRACE_VERDICT:
+            yield _verdict_record(self.accept[state] == 1, self.state_labels[state], steps, tape)
+
+    def __steps(self, tape):
+        table = self.table
+        labels = self.state_labels
+        k = len(self.classes)
+        state = self.start
+        steps = 0
+        try:
+            for char in tape:
+                new_state = table[state * k + self.symbol_map[char]]
+                yield _step_record(steps, labels[state], char, labels[new_state])
+                state = new_state
+                steps += 1
+        except KeyError as e:
+            raise InvalidCharacterInTape(*e.args)
+        return state, steps
+
+
+class FrozenMachine(AttributeError):
+    pass
+
+
+class _CompiledRun:
+    """
+    run state for a compiled machine's exec, which keeps none
+    of its own
+    """
+    def __init__(self, stats: Stats):
+        self.stats = stats
+        self.current_state = None
+        self.current_position = 0
 
-        ret[kEXEC_OUTPUT] = output
-        ret[kEXEC_TAPE] = str(self.loaded_tape)
-        return ret
 
 class InvalidCharacterInTape(Exception):
     pass
 
 class NFAlambda(Machine):
-    def __init__(self, filepath=None):
+    def __init__(self, filepath=None, cache_size=kSUBSET_CACHE_SIZE, stats: Stats = None):
         self.states: set = None
         self.alpha: set = None
         self.d_table: dict = None
         self.start: str = None
         self.accept: set = None
-        super().__init__(filepath)
+        # lazily built DFA states, LRU ordered, None is unbounded
+        self.cache_size = cache_size
+        self._subset_cache = collections.OrderedDict()
+        self._bitset: BitsetNFA = None
+        # (bitset, registry, masks, table, accept ids) of the last
+        # conversion, patched by the next one after an edit
+        self._conversion: tuple = None
+        self.convert_report: dict = None
+        super().__init__(filepath, stats)
 
     def config(self, filepath):
+        self._subset_cache.clear()
+        self._bitset = None
+        if compact_kind(filepath) is not None:
+            return self.__config_compact(filepath)
         with open(filepath, encoding='utf-8') as f:
-            configuration = json.load(f)
+            with _timer(self.stats, kSTAT_PARSE):
+                configuration = json.load(f)
+            validate_start = time.perf_counter()
 
             # check needed blocks
             needed_configs = {kSTATES_PREFIX, kALPHA_PREFIX, \
@@ -281,28 +1270,41 @@ class NFAlambda(Machine):
             if not all_blocks_present:
                 raise MissingConfigBlock(set(configuration.keys()).difference(needed_configs))
 
-            # validate blocks
-            self.states = set(configuration[kSTATES_PREFIX])
-            if self.states == set():
-                raise InvalidConfigBlock(kSTATES_PREFIX, self.states)
-            self.alpha = set(configuration[kALPHA_PREFIX])
-            if self.alpha == set():
-                raise InvalidConfigBlock(kALPHA_PREFIX, self.alpha)
-            self.d_table = configuration[kDTABLE_PREFIX]
-            for this_state in self.d_table.keys():
-                for this_char in self.d_table[this_state].keys():
-                    if self.d_table[this_state][this_char] == kEMPTYSET:
-                        self.d_table[this_state][this_char] = set()
-                    else:
-                        self.d_table[this_state][this_char] = set(self.d_table[this_state][this_char])
-                        if not self.d_table[this_state][this_char].issubset(self.states):
-                            raise InvalidConfigBlock(kDTABLE_PREFIX, self.d_table[this_state][this_char])
-            self.start = configuration[kSTART_PREFIX]
-            if not self.start in self.states:
-                raise InvalidConfigBlock(kSTART_PREFIX, self.start)
-            self.accept = set(configuration[kACCEPT_PREFIX])
-            if not self.accept.issubset(self.states):
-                raise InvalidConfigBlock(kACCEPT_PREFIX, self.accept)
+            # validate blocks, into a new table so the machine is only
+            # changed once the whole configuration is known to be good
+            states = set(configuration[kSTATES_PREFIX])
+            if states == set():
+                raise InvalidConfigBlock(kSTATES_PREFIX, states)
+            alpha = set(configuration[kALPHA_PREFIX])
+            if alpha == set():
+                raise InvalidConfigBlock(kALPHA_PREFIX, alpha)
+            d_table = dict()
+            for this_state, row in configuration[kDTABLE_PREFIX].items():
+                d_table[this_state] = dict()
+                for this_char, targets in row.items():
+                    targets = set() if targets == kEMPTYSET else set(targets)
+                    if not targets.issubset(states):
+                        raise InvalidConfigBlock(kDTABLE_PREFIX, targets)
+                    d_table[this_state][this_char] = targets
+            start = configuration[kSTART_PREFIX]
+            if not start in states:
+                raise InvalidConfigBlock(kSTART_PREFIX, start)
+            accept = set(configuration[kACCEPT_PREFIX])
+            if not accept.issubset(states):
+                raise InvalidConfigBlock(kACCEPT_PREFIX, accept)
+            self.states, self.alpha, self.d_table, self.start, self.accept = states, alpha, d_table, start, accept
+            if self.stats is not None:
+                self.stats.add_time(kSTAT_VALIDATE, time.perf_counter() - validate_start)
+
+    def __config_compact(self, filepath):
+        with _timer(self.stats, kSTAT_PARSE):
+            labels, alpha, rows, start, accept = _read_compact(filepath, kCOMPACT_NFAL)
+        self.states = set(labels)
+        self.alpha = set(alpha)
+        self.d_table = {labels[i]: {a: {labels[t] for t in row[j]} for j, a in enumerate(alpha)}
+                        for i, row in enumerate(rows)}
+        self.start = labels[start]
+        self.accept = {labels[q] for q in accept}
 
     def __config(self) -> dict:
         config = {}
@@ -319,15 +1321,203 @@ class NFAlambda(Machine):
         config[kACCEPT_PREFIX] = list(self.accept)
         return config
 
-    def export(self, filepath):
+    def export(self, filepath, compact: bool = False):
+        """
+        :param filepath: destination
+        :param compact: write the compact format, one row of target
+            index lists per state, instead of JSON
+        """
         with open(filepath, "w+", encoding='utf-8') as f:
-            json.dump(self.__config(), f, sort_keys=True, indent=4, ensure_ascii=False)
+            if compact:
+                labels = [self.start] + sorted(self.states.difference({self.start}))
+                index = {q: i for i, q in enumerate(labels)}
+                alpha = sorted(self.alpha)
+                rows = ([",".join(str(t) for t in sorted(index[x] for x in self.d_table[q].get(a, ())))
+                         or kCOMPACT_EMPTY for a in alpha] for q in labels)
+                _write_compact(f, kCOMPACT_NFAL, labels, alpha, 0, [index[q] for q in self.accept], rows)
+            else:
+                json.dump(self.__config(), f, sort_keys=True, indent=4, ensure_ascii=False)
 
     def dumps(self) -> str:
         return json.dumps(self.__config(), sort_keys=True, indent=4, ensure_ascii=False)
 
-    def exec(self):
-        raise AttributeError("exec disabled for NFAlambda")
+    def compile(self) -> "BitsetNFA":
+        """
+        builds, once per configuration, the bitset form of the
+        machine used for simulation and conversion. After the
+        configuration is changed it is rebuilt from the one the
+        last conversion used, see BitsetNFA
+
+        :return: BitsetNFA for this machine
+        """
+        if self._bitset is None:
+            previous = None if self._conversion is None else self._conversion[0]
+            with _timer(self.stats, kSTAT_COMPILE):
+                self._bitset = BitsetNFA(self, previous)
+            if self.stats is not None:
+                bitset = self._bitset
+                self.stats.count(kSTAT_CLOSURES, len(bitset.closures) - bitset.closures_reused)
+                self.stats.count(kSTAT_CLOSURES_REUSED, bitset.closures_reused)
+                self.stats.count(kSTAT_CLOSURE_CALLS, bitset.closure_calls)
+        return self._bitset
+
+    def _count_steps(self, steps: int):
+        """
+        every step of a run looks its successor up in the subset
+        cache, so hits are the lookups less the steps computed
+        """
+        if self.stats is not None:
+            self.stats.count(kSTAT_TRANSITIONS, steps)
+            self.stats.count(kSTAT_SUBSET_LOOKUPS, steps)
+
+    def subset_step(self, subset: int, char: str) -> int:
+        """
+        DFA transition built on demand, the successor subset is
+        computed the first time it is reached and kept in an LRU
+        cache that is shared by every tape run on this machine
+
+        the cache is only a memo, runs on other threads may add or
+        evict entries at any point and at worst a step is computed
+        twice, so no lock is taken
+
+        :param subset: lambda closed BitsetNFA state mask
+        :param char: symbol read
+        :return: lambda closed successor mask
+        """
+        cache = self._subset_cache
+        row = cache.get(subset)
+        if row is None:
+            row = cache.setdefault(subset, dict())
+            if self.stats is not None:
+                self.stats.count(kSTAT_SUBSET_NEW)
+            if self.cache_size is not None and len(cache) > self.cache_size:
+                try:
+                    cache.popitem(last=False)
+                except KeyError:
+                    pass
+                if self.stats is not None:
+                    self.stats.count(kSTAT_SUBSET_EVICTED)
+        else:
+            try:
+                cache.move_to_end(subset)
+            except KeyError:
+                pass
+        successor = row.get(char)
+        if successor is not None:
+            return successor
+        bitset = self.compile()
+        try:
+            symbol = bitset.symbol_map[char]
+        except KeyError:
+            raise InvalidCharacterInTape(char)
+        successor = row[char] = bitset.step(subset, symbol)
+        if self.stats is not None:
+            self.stats.count(kSTAT_SUBSET_STEPS)
+        return successor
+
+    def run(self, tape) -> frozenset:
+        """
+        runs the tape without building a trace
+
+        :param tape: str, Tape or any iterable of symbols
+        :return: set of NFA states active at the end of the tape
+        """
+        return frozenset(self.compile().labels(self._run(tape)[0]))
+
+    def _run(self, tape, stop: bool = False) -> tuple:
+        exec_start = time.perf_counter()
+        subset, steps = self._walk(tape, stop)
+        if self.stats is not None:
+            self._count_steps(steps)
+            self.stats.add_time(kSTAT_EXEC, time.perf_counter() - exec_start)
+        return subset, steps
+
+    def _walk(self, tape, stop: bool = False) -> tuple:
+        """
+        :param stop: leave off once no NFA state is left active,
+            checked every kVERDICT_BLOCK symbols
+        :return: (subset, steps), where the run ended
+        """
+        subset = self.compile().start
+        steps = 0
+        chunks = _chunks(tape)
+        for chunk in chunks:
+            for block in _blocks(chunk):
+                if stop and subset == 0:
+                    _check_symbols(block, self.compile().symbol_map)
+                    continue
+                for char in block:
+                    subset = self.subset_step(subset, char)
+                steps += len(block)
+        return subset, steps
+
+    def accepts(self, tape) -> bool:
+        """
+        accept-only run mode, no trace is produced. The run stops
+        early once no NFA state is left active, the rest of the
+        tape is then only checked for invalid characters
+
+        :param tape: str, Tape or any iterable of symbols
+        :return: True if the machine accepts the tape
+        """
+        return self._run(tape, True)[0] & self.compile().accept != 0
+
+    def runner(self, encoding: str = None) -> "NFARunner":
+        """
+        :param encoding: see Runner
+        :return: incremental runner, fed the tape a chunk at a time
+        """
+        return NFARunner(self, encoding)
+
+    def exec(self, verbosity: int = kTRACE_FULL, tail: int = kTRACE_TAIL_STEPS) -> dict:
+        """
+        runs the loaded tape directly, building DFA states
+        only as the input reaches them
+
+        :param verbosity: kTRACE_NONE, kTRACE_VERDICT, kTRACE_TAIL or kTRACE_FULL
+        :param tail: steps kept at kTRACE_TAIL
+        :return: dict with accepted, output and tape entries
+        """
+        exec_start = time.perf_counter()
+        records = self.trace(None, max(verbosity, kTRACE_VERDICT), tail)
+        run = _CompiledRun(self.stats)
+        ret = _exec_result(run, records, verbosity, exec_start)
+        if self.stats is not None:
+            self.stats.count(kSTAT_SUBSET_LOOKUPS, run.current_position)
+        return ret
+
+    def trace(self, tape=None, verbosity: int = kTRACE_FULL, tail: int = kTRACE_TAIL_STEPS):
+        """
+        lazy execution trace, states are labelled with the
+        subset of NFA states they stand for, see DFA.trace
+
+        :param tape: tape to run, defaults to the loaded tape
+        :param verbosity: kTRACE_NONE, kTRACE_VERDICT, kTRACE_TAIL or kTRACE_FULL
+        :param tail: steps kept at kTRACE_TAIL
+        :return: generator of dict records
+        """
+        tape = self.loaded_tape if tape is None else tape
+        bitset = self.compile()
+        if verbosity >= kTRACE_TAIL:
+            subset, steps = yield from _select(self.__steps(tape), verbosity, tail)
+        else:
+            subset, steps = self._walk(tape, True)
+        if verbosity >= kTRACE_VERDICT:
+            label = bitset.name(subset)
+            yield _verdict_record(subset & bitset.accept != 0, label, steps, tape)
+
+    def __steps(self, tape):
+        bitset = self.compile()
+        subset = bitset.start
+        label = bitset.name(subset)
+        steps = 0
+        for char in tape:
+            subset = self.subset_step(subset, char)
+            new_label = bitset.name(subset)
+            yield _step_record(steps, label, char, new_label)
+            label = new_label
+            steps += 1
+        return subset, steps
 
     def lambda_closure2(self, state) -> set:
         """
@@ -371,18 +1561,11 @@ class NFAlambda(Machine):
         return lc
 
     def t_table(self) -> dict:
+        bitset = self.compile()
         t_table = collections.defaultdict(dict)
-        reduced_alpha = copy.deepcopy(self.alpha)
-        reduced_alpha.remove(kLAMBA)
-        for this_state in self.states:
-            for this_char in reduced_alpha:
-                working_set = set()
-                lc = self.lambda_closure(this_state)
-                for state in lc:
-                    possible_transitions = self.lambda_closure(self.d_table[state][this_char])
-                    working_set = working_set.union(possible_transitions)
-                t_table[this_state][this_char] = working_set
-
+        for i, this_state in enumerate(bitset.state_labels):
+            for this_char, j in bitset.symbol_map.items():
+                t_table[this_state][this_char] = bitset.labels(bitset.t_row(i, j))
         return t_table
 
     def dumps_ttable(self) -> str:
@@ -395,78 +1578,603 @@ class NFAlambda(Machine):
         return json.dumps(t_table, sort_keys=True, indent=4, ensure_ascii=False)
 
     def convert(self) -> DFA:
-        # empty DFA
-        Mprime = DFA()
-        # init q0
-        # Mprime.start = copy.deepcopy(self.start)
-        Mprime.start = Node(self.lambda_closure(self.start)).label
-        # init sigma'
-        Mprime.alpha = copy.deepcopy(self.alpha)
-        Mprime.alpha.remove(kLAMBA)
-        # empty dtable
-        Mprime.d_table = collections.defaultdict(dict)
+        """
+        subset construction as a worklist over bitset masks, every
+        DFA state is registered once in a dict keyed on its mask so
+        finding an existing state is a single hash lookup
 
-        t_table = self.t_table()
+        the subset graph is kept, and when the configuration has
+        been changed since it is patched in place: only the DFA
+        states holding an NFA state whose moves changed are stepped
+        again, subsets they now reach are added and states the
+        start no longer reaches are dropped. The result has the
+        states and transitions of a conversion from scratch, the
+        new states numbered after the old ones
+
+        a summary of the run is left in self.convert_report
+
+        :return: DFA equivalent to this machine
+        """
+        with _timer(self.stats, kSTAT_CONVERT):
+            return self.__convert()
+
+    def __convert(self) -> DFA:
+        bitset = self.compile()
+        # one column per class of symbols the NFA does not tell apart
+        k = len(bitset.classes)
+        previous, self._conversion = self._conversion, None
+        if previous is not None and previous[0] is not bitset and \
+                (bitset.changed is None or previous[2][0] != bitset.start):
+            # renumbered NFA or a new start subset, nothing carries over
+            previous = None
+
+        if previous is None:
+            # registry of DFA states, mask to integer id in order of discovery
+            registry = {bitset.start: 0}
+            masks = [bitset.start]
+            table = array.array("i", [0]) * k
+            stepped = [0]
+            accept = None
+            redirected = False
+        else:
+            old_bitset, registry, masks, table, accept = previous
+            # NFA states whose moves changed, only the DFA states
+            # holding one of them are stepped again
+            dirty = 0 if old_bitset is bitset else bitset.changed
+            stepped = [X_id for X_id, X in enumerate(masks) if X & dirty] if dirty else list()
+            # arcs may be dropped when columns merge
+            redirected = old_bitset.classes != bitset.classes
+            if redirected:
+                # lay the table out by the new classes, a column of
+                # the old table per class through any of its symbols
+                old_k = len(old_bitset.classes)
+                old_table, table = table, array.array("i", [0]) * (len(masks) * k)
+                for a, symbols in enumerate(bitset.classes):
+                    table[a::k] = old_table[old_bitset.symbol_map[symbols[0]]::old_k]
+            elif stepped:
+                # machines from earlier conversions keep their tables
+                table = array.array("i", table)
+            if stepped:
+                masks = list(masks)
+            if old_bitset.accept != bitset.accept:
+                accept = None
+        # states whose successors are taken from the previous conversion
+        reused = len(masks) - len(stepped) if previous is not None else 0
+        old_rows = {X_id: table[X_id * k:X_id * k + k] for X_id in stepped} if previous is not None else None
+        # the start state counts as created when nothing carries over
+        first = len(masks) if previous is not None else 0
+        revisited = self.__explore(bitset, registry, masks, table, stepped)
+        if accept is not None:
+            accept = accept.union(X_id for X_id in range(first, len(masks)) if masks[X_id] & bitset.accept)
+        created = len(masks) - first
+
+        if redirected or old_rows and any(table[X_id * k:X_id * k + k] != row for X_id, row in old_rows.items()):
+            # states the start no longer reaches are dropped
+            masks, table, registry, accept = self.__prune(masks, table, k, registry, accept)
+        if accept is None:
+            accept = {X_id for X_id, X in enumerate(masks) if X & bitset.accept}
+
+        # names are only made from the masks when they are asked for
+        Mprime = DFA(stats=self.stats)
+        Mprime.start = 0
+        Mprime.alpha = set(bitset.symbols)
+        Mprime.d_table = TableRows(bitset.classes, table)
+        Mprime.states = set(range(len(masks)))
+        Mprime.accept = set(accept)
+        Mprime.label_map = SubsetLabels(bitset, masks)
+
+        self._conversion = (bitset, registry, masks, table, accept)
+        self.convert_report = {
+            kREPORT_GENERATED: len(masks),
+            kREPORT_REVISITED: revisited,
+            kREPORT_TRANSITIONS: len(masks) * k,
+            kREPORT_REUSED: reused,
+        }
+        if self.stats is not None:
+            self.stats.count(kSTAT_CONVERT_CREATED, created)
+            self.stats.count(kSTAT_CONVERT_DEDUPLICATED, revisited)
+            self.stats.count(kSTAT_CONVERT_REUSED, reused)
+        return Mprime
+
+    @staticmethod
+    def __explore(bitset: "BitsetNFA", registry: dict, masks: list, table: array.array, worklist: list) -> int:
+        """
+        steps the DFA states in the worklist, states first reached
+        are registered, given a row of the table and stepped in turn
+
+        :return: number of arcs to states already registered
+        """
+        k = len(bitset.classes)
+        blank = array.array("i", [0]) * k
+        revisited = 0
+        i = 0
+        while i < len(worklist):
+            X_id = worklist[i]
+            X = masks[X_id]
+            base = X_id * k
+            for a in range(k):
+                Y = bitset.step(X, a)
+                Y_id = registry.get(Y)
+                if Y_id is None:
+                    # arcing to a new node
+                    Y_id = registry[Y] = len(masks)
+                    masks.append(Y)
+                    worklist.append(Y_id)
+                    table.extend(blank)
+                else:
+                    revisited += 1
+                table[base + a] = Y_id
+            i += 1
+        return revisited
+
+    @staticmethod
+    def __prune(masks: list, table: array.array, k: int, registry: dict, accept: set) -> tuple:
+        """
+        drops the DFA states the start no longer reaches, the others
+        keep their order
+
+        :return: (masks, table, registry, accept) over the kept states
+        """
+        reached = bytearray(len(masks))
+        reached[0] = 1
+        stack = [0]
+        while stack:
+            base = stack.pop() * k
+            for Y_id in table[base:base + k]:
+                if not reached[Y_id]:
+                    reached[Y_id] = 1
+                    stack.append(Y_id)
+        if all(reached):
+            return masks, table, registry, accept
+        renumber = array.array("i", [-1]) * len(masks)
+        kept = [X_id for X_id in range(len(masks)) if reached[X_id]]
+        for new_id, X_id in enumerate(kept):
+            renumber[X_id] = new_id
+        for X_id in range(len(masks)):
+            if not reached[X_id]:
+                del registry[masks[X_id]]
+        for new_id, X_id in enumerate(kept):
+            registry[masks[X_id]] = new_id
+        pruned = array.array("i", (renumber[Y_id] for X_id in kept for Y_id in table[X_id * k:X_id * k + k]))
+        if accept is not None:
+            accept = {renumber[X_id] for X_id in accept if reached[X_id]}
+        return [masks[X_id] for X_id in kept], pruned, registry, accept
+
+
+class BitsetNFA:
+    """
+    NFA-lambda with every state as a bit index, the lambda
+    closures and the per symbol transitions are precomputed
+    once as integer masks
+
+    a step ORs together one 256 entry table lookup for every
+    8 states in the current set
+
+    symbols with the same moves out of every state form one class,
+    symbol_map takes a symbol to its class and the moves are kept
+    once per class
+    """
+    def __init__(self, nfa: NFAlambda, previous: "BitsetNFA" = None):
+        """
+        :param nfa: machine to compile
+        :param previous: bitset form of an earlier configuration of
+            the same machine, the closures and step tables an edit
+            left alone are taken from it, and changed records which
+            states' moves differ from it
+        """
+        self.state_labels: list = sorted(nfa.states)
+        self.state_map: dict = {q: i for i, q in enumerate(self.state_labels)}
+        # subset names are listed in braces when run together they are ambiguous
+        self.braced: bool = not Node.prefix_free(self.state_labels)
+        self.symbols: list = sorted(nfa.alpha.difference({kLAMBA}))
+        n = len(self.state_labels)
+        if previous is not None and (previous.state_labels != self.state_labels or
+                                     previous.symbols != self.symbols):
+            # states or symbols renumbered, nothing carries over
+            previous = None
+
+        # lambda closure of every state, a closure with no state whose
+        # lambda moves were edited is the same as before
+        self.lambda_moves: list = [self.mask(nfa.d_table[q].get(kLAMBA, ())) for q in self.state_labels]
+        edited = 0
+        if previous is not None:
+            for i, (mask, old) in enumerate(zip(self.lambda_moves, previous.lambda_moves)):
+                if mask != old:
+                    edited |= 1 << i
+        self.closures: list = list()
+        # closures carried over from previous, and closures looked up
+        # to close the moves below, reported by NFAlambda.compile
+        self.closures_reused: int = 0
+        self.closure_calls: int = 0
+        for i in range(n):
+            if previous is not None and previous.closures[i] & edited == 0:
+                self.closures.append(previous.closures[i])
+                self.closures_reused += 1
+                continue
+            closure = 1 << i
+            stack = [i]
+            while stack:
+                pending = self.lambda_moves[stack.pop()] & ~closure
+                closure |= pending
+                while pending:
+                    low = pending & -pending
+                    stack.append(low.bit_length() - 1)
+                    pending ^= low
+            self.closures.append(closure)
+
+        # moves[a][i], lambda closure of the moves out of state i on class a
+        self.moves: list = list()
+        registry = dict()
+        self.symbol_map: dict = dict()
+        for this_char in self.symbols:
+            row = tuple(self.__closure(self.mask(nfa.d_table[q].get(this_char, ()))) for q in self.state_labels)
+            self.symbol_map[this_char] = registry.setdefault(row, len(self.moves))
+            if self.symbol_map[this_char] == len(self.moves):
+                self.moves.append(list(row))
+        self.classes: tuple = _symbol_classes(self.symbols, self.symbol_map)
+
+        self.start: int = self.closures[self.state_map[nfa.start]]
+        self.accept: int = self.mask(nfa.accept)
+
+        # states whose moves on some symbol differ from previous
+        self.changed: int = None
+        old_groups = dict()
+        if previous is not None:
+            self.changed = 0
+            pairs = {(self.symbol_map[a], previous.symbol_map[a]) for a in self.symbols}
+            for a, b in pairs:
+                for i, (mask, old) in enumerate(zip(self.moves[a], previous.moves[b])):
+                    if mask != old:
+                        self.changed |= 1 << i
+            old_groups = {tuple(row): groups for row, groups in zip(previous.moves, previous._move_groups)}
+
+        if previous is not None and previous.closures == self.closures:
+            self._closure_groups = previous._closure_groups
+        else:
+            self._closure_groups = self.__groups(self.closures)
+        self._move_groups = [old_groups.get(tuple(row)) or self.__groups(row) for row in self.moves]
+
+    @staticmethod
+    def __groups(masks: list) -> list:
+        groups = list()
+        for base in range(0, len(masks), 8):
+            table = [0] * 256
+            for b in range(1, 256):
+                low = b & -b
+                bit = base + low.bit_length() - 1
+                table[b] = table[b ^ low] | (masks[bit] if bit < len(masks) else 0)
+            groups.append(table)
+        return groups
+
+    def __closure(self, mask: int) -> int:
+        result = 0
+        while mask:
+            low = mask & -mask
+            result |= self.closures[low.bit_length() - 1]
+            mask ^= low
+            self.closure_calls += 1
+        return result
+
+    @staticmethod
+    def __union(groups: list, mask: int) -> int:
+        result = 0
+        g = 0
+        while mask:
+            result |= groups[g][mask & 0xFF]
+            mask >>= 8
+            g += 1
+        return result
+
+    def mask(self, states) -> int:
+        """
+        :param states: iterable of state labels
+        :return: bitmask of those states
+        """
+        result = 0
+        for q in states:
+            result |= 1 << self.state_map[q]
+        return result
+
+    def labels(self, mask: int) -> set:
+        """
+        :param mask: bitmask of states
+        :return: set of state labels in the mask
+        """
+        return {self.state_labels[i] for i in _bits(mask)}
+
+    def name(self, mask: int) -> str:
+        """
+        :param mask: bitmask of states
+        :return: name of the subset, see Node.set2node
+        """
+        return Node.set2node(self.labels(mask), self.braced)
 
-        # init the nodes list
-        nodes = set()
-        nodes.add(Node(self.lambda_closure(self.start)))
-        completed_nodes = set()
+    def closure(self, mask: int) -> int:
+        """
+        :param mask: bitmask of states
+        :return: lambda closure of the mask
+        """
+        return self.__union(self._closure_groups, mask)
 
-        # start loop
-        bDone = False
-        while not bDone:
+    def step(self, mask: int, symbol: int) -> int:
+        """
+        :param mask: lambda closed bitmask of states
+        :param symbol: class of the symbol read, see symbol_map
+        :return: lambda closed successor mask
+        """
+        return self.__union(self._move_groups[symbol], mask)
+
+    def t_row(self, state: int, symbol: int) -> int:
+        """
+        :param state: index of a state
+        :param symbol: class of a symbol
+        :return: T-Table entry for the state and symbol as a mask
+        """
+        return self.step(self.closures[state], symbol)
+
+    def accepts(self, tape) -> bool:
+        """
+        plain set simulation, no DFA states are cached
+
+        :param tape: str, Tape or any iterable of symbols
+        :return: True if the machine accepts the tape
+        """
+        mask = self.start
+        chunks = _chunks(tape)
+        try:
+            for chunk in chunks:
+                for char in chunk:
+                    mask = self.step(mask, self.symbol_map[char])
+        except KeyError as e:
+            raise InvalidCharacterInTape(*e.args)
+        return mask & self.accept != 0
+
+
+class Runner(abc.ABC):
+    """
+    incremental execution, the tape is fed a chunk at a time as
+    it arrives and only the current state is kept, so a stream
+    of any length runs in constant memory
+
+    with an encoding, chunks are bytes and are decoded
+    incrementally, a character split across two chunks is
+    held back until its last byte arrives
+
+    once the verdict is decided, see is_decided, fed chunks are
+    only checked for invalid characters, and a reader can stop
+    feeding
+    """
+    def __init__(self, start, stats: Stats = None, encoding: str = None):
+        """
+        :param start: start state
+        :param stats: counters for transitions taken, or None
+        :param encoding: codec for byte chunks, None for str chunks
+        """
+        self.start = start
+        self.state = start
+        self.position = 0
+        self.stats = stats
+        self.encoding = encoding
+        self._decoder = None if encoding is None else codecs.getincrementaldecoder(encoding)()
+
+    @abc.abstractmethod
+    def _advance(self, state, chunk) -> tuple:
+        """
+        :return: (state, steps), steps stops short of the chunk when
+            the run reached a state whose verdict is fixed
+        """
+
+    def _count(self, steps: int):
+        self.stats.count(kSTAT_TRANSITIONS, steps)
+
+    def feed(self, chunk) -> "Runner":
+        """
+        runs the chunk from the current state. A chunk holding an
+        invalid character leaves the runner as it was before it
+
+        :param chunk: str, or bytes when the runner has an encoding
+        :return: the runner
+        """
+        if self._decoder is not None:
+            snapshot = self.snapshot()
             try:
-                this_node = nodes.pop()
-            except KeyError as e:
-                # out of nodes
-                bDone = True
+                chunk = self._decoder.decode(chunk)
+                self.state, steps = self._advance(self.state, chunk)
+            except InvalidCharacterInTape:
+                self.restore(snapshot)
+                raise
+        else:
+            self.state, steps = self._advance(self.state, chunk)
+        self.position += len(chunk)
+        if self.stats is not None:
+            self._count(steps)
+        return self
+
+    @abc.abstractmethod
+    def is_accepting(self) -> bool:
+        """
+        :return: True if the machine accepts what was fed so far
+        """
+
+    @abc.abstractmethod
+    def is_decided(self) -> bool:
+        """
+        :return: True when no further input can change is_accepting
+        """
+
+    def reset(self):
+        """
+        back to the start state at position 0
+        """
+        self.state = self.start
+        self.position = 0
+        if self._decoder is not None:
+            self._decoder.reset()
+
+    def snapshot(self) -> tuple:
+        """
+        :return: (state, position, decoder state), a plain tuple
+            that can be stored or pickled and handed to restore
+        """
+        decoder = None if self._decoder is None else self._decoder.getstate()
+        return self.state, self.position, decoder
+
+    def restore(self, snapshot: tuple):
+        """
+        :param snapshot: value returned by snapshot
+        """
+        self.state, self.position, decoder = snapshot
+        if self._decoder is not None:
+            self._decoder.setstate(decoder)
+
+
+class CompiledRunner(Runner):
+    """
+    runner over a CompiledDFA, the state is the state index
+    """
+    def __init__(self, compiled: CompiledDFA, encoding: str = None):
+        super().__init__(compiled.start, compiled.stats, encoding)
+        self.compiled = compiled
+
+    def _advance(self, state, chunk):
+        table = self.compiled.table
+        symbol_map = self.compiled.symbol_map
+        k = len(self.compiled.classes)
+        fixed = self.compiled.fixed()
+        steps = 0
+        try:
+            for block in _blocks(chunk):
+                if fixed[state]:
+                    _check_symbols(block, symbol_map)
+                    continue
+                for char in block:
+                    state = table[state * k + symbol_map[char]]
+                steps += len(block)
+        except KeyError as e:
+            raise InvalidCharacterInTape(*e.args)
+        return state, steps
+
+    def is_accepting(self) -> bool:
+        return self.compiled.accept[self.state] == 1
+
+    def is_decided(self) -> bool:
+        return self.compiled.fixed()[self.state] != kFIXED_OPEN
+
+    def label(self) -> str:
+        """
+        :return: name of the current DFA state
+        """
+        return self.compiled.state_labels[self.state]
+
+
+class NFARunner(Runner):
+    """
+    runner over an NFAlambda, the state is the lambda closed
+    mask of active states, stepped through the lazy subset cache
+    """
+    def __init__(self, nfa: NFAlambda, encoding: str = None):
+        super().__init__(nfa.compile().start, nfa.stats, encoding)
+        self.nfa = nfa
+
+    def _advance(self, state, chunk):
+        steps = 0
+        for block in _blocks(chunk):
+            if state == 0:
+                _check_symbols(block, self.nfa.compile().symbol_map)
                 continue
-            for this_char in Mprime.alpha:
-                X = this_node
-                a = this_char
-                Y_set = set()
-                for this_state in X.set:
-                    Y_set = Y_set.union(self.lambda_closure(t_table[this_state][a]))
-                Y = Node(Y_set)
-
-                # looping to itself
-                if hash(Y) == hash(X):
-                    Y = X
-                # arcing to an existing node
-                elif Y in nodes or Y in completed_nodes:
-                    if Y in nodes:
-                        for a_node in nodes:
-                            if hash(a_node) == hash(Y):
-                                Y = a_node
-                                break
-                    else:
-                        for a_node in completed_nodes:
-                            if hash(a_node) == hash(Y):
-                                Y = a_node
-                                break
-                # arcing to a new node
-                else:
-                    nodes.add(Y)
-                X.set_d_table_entry(a, Y)
-            completed_nodes.add(this_node)
+            for char in block:
+                state = self.nfa.subset_step(state, char)
+            steps += len(block)
+        return state, steps
 
-        # now that we have the nodes, fill in the table, states and accepting
-        Mprime.states = set()
-        Mprime.accept = set()
-        for this_node in completed_nodes:
-            # add the state to Q
-            Mprime.states.add(this_node.label)
-            # fill out the d_table
-            for this_char in Mprime.alpha:
-                Mprime.d_table[this_node.label][this_char] = this_node.get_d_table_entry(this_char).label
-            if self.accept.intersection(this_node.set):
-                Mprime.accept.add(this_node.label)
+    def _count(self, steps: int):
+        self.nfa._count_steps(steps)
 
-        return Mprime
+    def is_accepting(self) -> bool:
+        return self.state & self.nfa.compile().accept != 0
+
+    def is_decided(self) -> bool:
+        # only the empty set is known to be final without converting
+        return self.state == 0
+
+    def label(self) -> str:
+        """
+        :return: name of the current subset state
+        """
+        return self.nfa.compile().name(self.state)
+
+
+class TableRows(collections.abc.Mapping):
+    """
+    read only d_table over a flat transition array, states are
+    the row numbers and each row is a TableRow mapping symbol to
+    target state, so a converted DFA keeps one int per class of
+    symbols instead of a dict per state
+    """
+    __slots__ = ("symbols", "classes", "symbol_map", "table")
+
+    def __init__(self, classes: tuple, table: array.array):
+        """
+        :param classes: column order of the table, each column a
+            tuple of the symbols that share it
+        :param table: table[state * len(classes) + class]
+        """
+        self.classes = classes
+        self.symbol_map = {a: i for i, symbols in enumerate(classes) for a in symbols}
+        self.symbols = sorted(self.symbol_map)
+        self.table = table
+
+    def __getitem__(self, state: int) -> "TableRow":
+        if not isinstance(state, int) or not 0 <= state < len(self):
+            raise KeyError(state)
+        return TableRow(self, state)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self):
+        return len(self.table) // len(self.classes) if self.classes else 0
+
+
+class TableRow(collections.abc.Mapping):
+    __slots__ = ("rows", "state")
+
+    def __init__(self, rows: TableRows, state: int):
+        self.rows = rows
+        self.state = state
+
+    def __getitem__(self, char: str) -> int:
+        rows = self.rows
+        return rows.table[self.state * len(rows.classes) + rows.symbol_map[char]]
+
+    def __iter__(self):
+        return iter(self.rows.symbols)
+
+    def __len__(self):
+        return len(self.rows.symbols)
+
+
+class SubsetLabels:
+    """
+    names of the states of a converted DFA, state i is named
+    after the subset of NFA states in masks[i] when it is looked up
+    """
+    __slots__ = ("bitset", "masks")
+
+    def __init__(self, bitset: "BitsetNFA", masks: list):
+        self.bitset = bitset
+        self.masks = masks
+
+    def __getitem__(self, state: int) -> str:
+        return self.bitset.name(self.masks[state])
+
+    def __len__(self):
+        return len(self.masks)
 
 
 class Node:
+    __slots__ = ("set", "label", "d_table_entry")
+
     def __init__(self, this_set: set):
         self.set: set = this_set
         self.label: str = self.set2node(self.set)
@@ -480,10 +2188,7 @@ class Node:
         return "Node: {0}".format(self.label)
 
     def __eq__(self, other):
-        if hash(self) == hash(other):
-            return True
-        else:
-            return False
+        return isinstance(other, Node) and self.label == other.label
 
     # def completed(self):
     #     self.complete = True
@@ -491,17 +2196,31 @@ class Node:
     # def is_complete(self):
     #     return self.complete
 
-    def set2node(self, _set: set) -> str:
-        temp = ""
-        temp_list = list()
-        for this_item in _set:
-            temp_list.append(this_item)
-        temp_list.sort()
-        for a in temp_list:
-            temp += a
-        if temp == "":
-            temp = kEMPTYSET
-        return temp
+    @staticmethod
+    def set2node(_set: set, braced: bool = False) -> str:
+        """
+        :param _set: state names
+        :param braced: list the names in braces, for machines whose
+            names run together would be ambiguous, see prefix_free
+        :return: the names concatenated in order, or listed in braces
+        """
+        temp_list = sorted(_set)
+        if not temp_list:
+            return kEMPTYSET
+        if not braced:
+            return "".join(temp_list)
+        return "{" + ",".join(temp_list) + "}"
+
+    @staticmethod
+    def prefix_free(names) -> bool:
+        """
+        :param names: every state name of a machine
+        :return: True if no name starts another one, the names of
+            any subset run together can then be read back one way
+            only, otherwise {AB, C} and {A, BC} would share a name
+        """
+        temp_list = sorted(names)
+        return not any(b.startswith(a) for a, b in zip(temp_list, temp_list[1:]))
 
     def set_d_table_entry(self, _a: str, _node: "Node"):
         self.d_table_entry[_a] = _node
@@ -524,21 +2243,110 @@ class InvalidConfigBlock(Exception):
 
 class Tape:
     def __init__(self, in_string):
-        self.characters = list(in_string)
+        # kept as the string itself, only split into a list on write
+        self.characters = in_string
 
     def __str__(self):
-        contents = ""
-        for a in self.characters:
-            contents += a
-        return contents
+        if isinstance(self.characters, str):
+            return self.characters
+        return "".join(self.characters)
+
+    def __iter__(self):
+        return iter(self.characters)
+
+    def chunks(self):
+        """
+        yields the tape contents as runs of symbols
+
+        :return: generator of str or list chunks
+        """
+        yield self.characters
 
     def read(self, position):
         return self.characters[position]
 
     def write(self, character, position):
+        if isinstance(self.characters, str):
+            self.characters = list(self.characters)
         self.characters[position] = character
 
 
+class FileTape(Tape):
+    """
+    read only tape backed by a file, the file is memory mapped
+    and decoded a chunk at a time so it is never held in memory
+    as a whole
+
+    start and stop limit the tape to a byte range of the file
+    """
+    def __init__(self, filepath, encoding='utf-8', chunk_size=kTAPE_CHUNK, start=0, stop=None):
+        self.filepath = filepath
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.start = start
+        self.stop = stop
+        self.characters = None
+        self._position = -1
+        self._char = None
+        self._cursor = None
+        # fail early on a missing file
+        with open(self.filepath, "rb"):
+            pass
+
+    def __str__(self):
+        return self.filepath
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+    def chunks(self):
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        with open(self.filepath, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            stop = size if self.stop is None else min(self.stop, size)
+            if stop <= self.start:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(self.start, stop, self.chunk_size):
+                        chunk = decoder.decode(view[offset:min(offset + self.chunk_size, stop)])
+                        if chunk:
+                            yield chunk
+                finally:
+                    view.release()
+        chunk = decoder.decode(b"", final=True)
+        if chunk:
+            yield chunk
+
+    def read(self, position):
+        """
+        sequential reads are served from a running cursor and a
+        repeated read from the last symbol read, reading backwards
+        restarts from the top of the file
+
+        :param position: symbol index
+        :return: symbol at that position
+        """
+        if position == self._position:
+            return self._char
+        if self._cursor is None or position < self._position:
+            self._cursor = iter(self)
+            self._position = -1
+        try:
+            while self._position < position:
+                self._char = next(self._cursor)
+                self._position += 1
+        except StopIteration:
+            self._cursor = None
+            raise IndexError(position)
+        return self._char
+
+    def write(self, character, position):
+        raise TypeError("FileTape is read only")
+
+
 if __name__ == "__main__":
     test = NFAlambda("../configs/ex_341.nfal")
     test_prime = test.convert()
@@ -0,0 +1,158 @@
+"""
+compact binary format for compiled machines, loaded without
+copying through mmap, and a content addressed cache of compiled
+machines keyed on the source configuration file
+
+layout, little endian:
+    header      magic, version, states, classes, start, meta length
+    meta        JSON holding the symbol list, the class of every
+                symbol and the state labels
+    accept      one byte per state, 1 when accepting
+    table       states x classes int32 transition table
+sections after the header are aligned on 4 bytes
+"""
+import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import machine
+
+kMAGIC = b"CDFA"
+kVERSION = 2
+kHEADER = struct.Struct("<4sIIIII")
+kBINARY_EXT = "cdfa"
+kCACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "machine")
+kMETA_SYMBOLS = "symbols"
+kMETA_CLASSES = "classes"
+kMETA_STATES = "states"
+
+
+class InvalidBinaryMachine(Exception):
+    pass
+
+
+def _align(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def dumps(compiled: machine.CompiledDFA) -> bytes:
+    """
+    :param compiled: machine to serialise
+    :return: binary image of the machine
+    """
+    meta = json.dumps({kMETA_SYMBOLS: list(compiled.symbols),
+                       kMETA_CLASSES: [compiled.symbol_map[a] for a in compiled.symbols],
+                       kMETA_STATES: list(compiled.state_labels)},
+                      ensure_ascii=False).encode("utf-8")
+    n = len(compiled.state_labels)
+    header = kHEADER.pack(kMAGIC, kVERSION, n, len(compiled.classes), compiled.start, len(meta))
+    table = array.array("i", compiled.table)
+    if sys.byteorder != "little":
+        table.byteswap()
+    parts = [header, meta, b"\0" * (_align(len(meta)) - len(meta)),
+             bytes(compiled.accept), b"\0" * (_align(n) - n), table.tobytes()]
+    return b"".join(parts)
+
+
+def save(compiled: machine.CompiledDFA, filepath: str):
+    """
+    writes the machine, the file is replaced atomically so a
+    reader never sees a partial machine
+
+    :param compiled: machine to save
+    :param filepath: destination
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps(compiled))
+        os.replace(temp, filepath)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def load(filepath: str) -> machine.CompiledDFA:
+    """
+    maps the file and points the machine's table and accept map
+    straight into it, nothing but the small meta block is parsed
+
+    :param filepath: file written by save
+    :return: CompiledDFA backed by the mapped file
+    """
+    with open(filepath, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise InvalidBinaryMachine(filepath)
+    view = memoryview(mm)
+    if len(view) < kHEADER.size:
+        raise InvalidBinaryMachine(filepath)
+    magic, version, n, k, start, meta_length = kHEADER.unpack_from(view)
+    if magic != kMAGIC or version != kVERSION:
+        raise InvalidBinaryMachine(filepath, magic, version)
+    offset = kHEADER.size
+    meta = json.loads(bytes(view[offset:offset + meta_length]).decode("utf-8"))
+    offset += _align(meta_length)
+    accept = view[offset:offset + n]
+    offset += _align(n)
+    if len(view) != offset + 4 * n * k:
+        raise InvalidBinaryMachine(filepath)
+
+    compiled = machine.CompiledDFA()
+    compiled.symbols = meta[kMETA_SYMBOLS]
+    compiled.symbol_map = dict(zip(compiled.symbols, meta[kMETA_CLASSES]))
+    compiled.classes = machine._symbol_classes(compiled.symbols, compiled.symbol_map)
+    compiled.state_labels = meta[kMETA_STATES]
+    compiled.start = start
+    compiled.accept = accept
+    if sys.byteorder == "little":
+        compiled.table = view[offset:].cast("i")
+    else:
+        table = array.array("i", view[offset:])
+        table.byteswap()
+        compiled.table = table
+    return compiled.freeze()
+
+
+def cache_key(filepath: str, *stages: str) -> str:
+    """
+    :param filepath: source .dfa or .nfal configuration
+    :param stages: names of the steps applied to the source, e.g. conv, min
+    :return: hex digest of the source contents, stages and format version
+    """
+    digest = hashlib.sha256()
+    digest.update("{0}:{1}\n".format(kVERSION, ",".join(stages)).encode("utf-8"))
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached(filepath: str, build, stages=(), cache_dir: str = kCACHE_DIR) -> machine.CompiledDFA:
+    """
+    loads the compiled machine for a source configuration from the
+    cache, only building (parsing, validating, converting) it on a
+    miss
+
+    :param filepath: source .dfa or .nfal configuration
+    :param build: callable returning the CompiledDFA on a miss
+    :param stages: names of the steps build applies, part of the key
+    :param cache_dir: cache directory, created when missing
+    :return: CompiledDFA
+    """
+    target = os.path.join(cache_dir, "{0}.{1}".format(cache_key(filepath, *stages), kBINARY_EXT))
+    try:
+        return load(target)
+    except (FileNotFoundError, InvalidBinaryMachine):
+        pass
+    compiled = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    save(compiled, target)
+    return compiled
@@ -0,0 +1,157 @@
+"""
+language equivalence and inclusion between machines, decided
+on the fly from the start states without minimizing either
+side or building its whole DFA
+"""
+import collections
+
+import machine
+
+
+class _Side:
+    """
+    one machine seen as a deterministic machine over state
+    masks, a DFA state q is the mask 1 << q and an NFA-lambda
+    state is its lambda closed BitsetNFA subset. The empty mask
+    is the dead state, also entered on a symbol the machine lacks
+    """
+    def __init__(self, M):
+        if isinstance(M, machine.NFAlambda):
+            self.bitset = M.compile()
+            self.compiled = None
+            self.symbols = self.bitset.symbols
+            self.symbol_map = self.bitset.symbol_map
+            self.start = self.bitset.start
+            self.accept = self.bitset.accept
+        else:
+            self.bitset = None
+            self.compiled = M if isinstance(M, machine.CompiledDFA) else M.compile()
+            self.symbols = self.compiled.symbols
+            self.symbol_map = self.compiled.symbol_map
+            self.start = 1 << self.compiled.start
+            self.accept = sum(1 << q for q, x in enumerate(self.compiled.accept) if x == 1)
+
+    def step(self, mask: int, char: str) -> int:
+        if mask == 0:
+            return 0
+        if self.bitset is not None:
+            a = self.bitset.symbol_map.get(char)
+            return 0 if a is None else self.bitset.step(mask, a)
+        c = self.compiled
+        a = c.symbol_map.get(char)
+        if a is None:
+            return 0
+        return 1 << c.table[(mask.bit_length() - 1) * len(c.classes) + a]
+
+    def accepting(self, mask: int) -> bool:
+        return mask & self.accept != 0
+
+
+def _alphabet(sides) -> list:
+    """
+    :param sides: the _Side of each machine
+    :return: one symbol for every class of symbols that no machine
+        tells apart, those are the only moves worth exploring
+    """
+    symbols = sorted(set().union(*(side.symbols for side in sides)))
+    representatives = dict()
+    for a in symbols:
+        representatives.setdefault(tuple(side.symbol_map.get(a) for side in sides), a)
+    return sorted(representatives.values())
+
+
+def counterexample(A, B):
+    """
+    Hopcroft-Karp: pairs of states are explored breadth first from
+    the start pair and merged in a union-find, a pair already known
+    to be equal through earlier merges is not explored again
+
+    :param A: DFA, CompiledDFA or NFAlambda
+    :param B: DFA, CompiledDFA or NFAlambda
+    :return: a shortest tape accepted by exactly one of the
+        machines, or None when they accept the same language
+    """
+    sides = (_Side(A), _Side(B))
+    symbols = _alphabet(sides)
+    parent = dict()
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    start = ((0, sides[0].start), (1, sides[1].start))
+    parent[start[1]] = start[0]
+    queue = collections.deque([(sides[0].start, sides[1].start, "")])
+    while queue:
+        p, q, tape = queue.popleft()
+        if sides[0].accepting(p) != sides[1].accepting(q):
+            return tape
+        for char in symbols:
+            p_next = sides[0].step(p, char)
+            q_next = sides[1].step(q, char)
+            x = find((0, p_next))
+            y = find((1, q_next))
+            if x != y:
+                parent[y] = x
+                queue.append((p_next, q_next, tape + char))
+    return None
+
+
+def equivalent(A, B) -> bool:
+    """
+    :param A: DFA, CompiledDFA or NFAlambda
+    :param B: DFA, CompiledDFA or NFAlambda
+    :return: True if both machines accept the same language
+    """
+    return counterexample(A, B) is None
+
+
+def inclusion_counterexample(A, B):
+    """
+    antichain search for a tape in L(A) but not in L(B). A is
+    followed state by state, B as a subset, and a pair (p, S) is
+    dropped when some (p, S') with S' inside S has been seen, as
+    anything S' accepts S accepts too
+
+    :param A: DFA, CompiledDFA or NFAlambda
+    :param B: DFA, CompiledDFA or NFAlambda
+    :return: a shortest tape A accepts and B rejects, or None
+        when every tape A accepts B accepts too
+    """
+    a, b = _Side(A), _Side(B)
+    symbols = _alphabet((a, b))
+    antichain = collections.defaultdict(list)
+    queue = collections.deque()
+
+    def visit(p: int, subset: int, tape: str):
+        seen = antichain[p]
+        if any(s & ~subset == 0 for s in seen):
+            return
+        seen[:] = [s for s in seen if subset & ~s != 0]
+        seen.append(subset)
+        queue.append((p, subset, tape))
+
+    for p in machine._bits(a.start):
+        visit(p, b.start, "")
+    while queue:
+        p, subset, tape = queue.popleft()
+        if a.accepting(1 << p) and not b.accepting(subset):
+            return tape
+        for char in symbols:
+            successor = b.step(subset, char)
+            for r in machine._bits(a.step(1 << p, char)):
+                visit(r, successor, tape + char)
+    return None
+
+
+def included(A, B) -> bool:
+    """
+    :param A: DFA, CompiledDFA or NFAlambda
+    :param B: DFA, CompiledDFA or NFAlambda
+    :return: True if every tape A accepts B accepts too
+    """
+    return inclusion_counterexample(A, B) is None
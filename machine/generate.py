@@ -0,0 +1,100 @@
+"""
+seeded generators of machine configurations and tape corpora,
+used by benchmark.py
+"""
+import json
+import random
+
+import machine
+
+
+def random_nfal(states: int, alphabet: int, lambda_density: float = 0.05, fanout: float = 1.5,
+                accepting: float = 0.1, seed: int = 0) -> dict:
+    """
+    random NFA-lambda configuration. Each state also moves to the
+    next one on the first symbol, so every state is reachable from
+    the start and the DFA grows with the state count
+
+    :param states: number of states, named q0, q1, ...
+    :param alphabet: number of symbols, taken from a, b, ...
+    :param lambda_density: chance of a lambda edge between any two states
+    :param fanout: average number of random targets per state and symbol
+    :param accepting: fraction of accepting states, at least one
+    :param seed: random seed
+    :return: configuration dict in the .nfal layout
+    """
+    r = random.Random(seed)
+    names = ["q{0}".format(i) for i in range(states)]
+    symbols = [chr(ord("a") + i) for i in range(alphabet)]
+    d_table = dict()
+    for i, this_state in enumerate(names):
+        row = dict()
+        lambdas = [q for q in names if q != this_state and r.random() < lambda_density]
+        row[machine.kLAMBA] = lambdas or machine.kEMPTYSET
+        for this_char in symbols:
+            # geometric number of targets with the requested mean
+            targets = set()
+            while r.random() < fanout / (fanout + 1):
+                targets.add(r.choice(names))
+            if this_char == symbols[0]:
+                targets.add(names[(i + 1) % states])
+            row[this_char] = sorted(targets) or machine.kEMPTYSET
+        d_table[this_state] = row
+    config = dict()
+    config[machine.kSTATES_PREFIX] = names
+    config[machine.kALPHA_PREFIX] = [machine.kLAMBA] + symbols
+    config[machine.kDTABLE_PREFIX] = d_table
+    config[machine.kSTART_PREFIX] = names[0]
+    config[machine.kACCEPT_PREFIX] = r.sample(names, max(1, int(states * accepting)))
+    return config
+
+
+def nth_from_end(n: int) -> dict:
+    """
+    NFA-lambda for "the n-th symbol from the end is 1" over 0/1,
+    n + 1 states whose minimal DFA needs 2^n states
+
+    :param n: position from the end
+    :return: configuration dict in the .nfal layout
+    """
+    names = ["q{0}".format(i) for i in range(n + 1)]
+    d_table = {q: {machine.kLAMBA: machine.kEMPTYSET, "0": machine.kEMPTYSET, "1": machine.kEMPTYSET}
+               for q in names}
+    d_table["q0"]["0"] = ["q0"]
+    d_table["q0"]["1"] = ["q0", "q1"]
+    for i in range(1, n):
+        d_table[names[i]]["0"] = [names[i + 1]]
+        d_table[names[i]]["1"] = [names[i + 1]]
+    config = dict()
+    config[machine.kSTATES_PREFIX] = names
+    config[machine.kALPHA_PREFIX] = [machine.kLAMBA, "0", "1"]
+    config[machine.kDTABLE_PREFIX] = d_table
+    config[machine.kSTART_PREFIX] = names[0]
+    config[machine.kACCEPT_PREFIX] = [names[n]]
+    return config
+
+
+def write_config(config: dict, filepath: str):
+    """
+    :param config: configuration dict
+    :param filepath: destination, read back with DFA or NFAlambda
+    """
+    with open(filepath, "w+", encoding='utf-8') as f:
+        json.dump(config, f, sort_keys=True, ensure_ascii=False)
+
+
+def tape_corpus(symbols: list, count: int, min_length: int, max_length: int, seed: int = 0):
+    """
+    random tapes over the given symbols
+
+    :param symbols: symbols to draw from, lambda excluded
+    :param count: number of tapes
+    :param min_length: shortest tape
+    :param max_length: longest tape
+    :param seed: random seed
+    :return: generator of str
+    """
+    r = random.Random(seed)
+    symbols = [a for a in symbols if a != machine.kLAMBA]
+    for _ in range(count):
+        yield "".join(r.choice(symbols) for _ in range(r.randint(min_length, max_length)))
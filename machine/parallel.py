@@ -0,0 +1,270 @@
+"""
+process pool execution of a compiled machine, over many tapes
+or speculatively over pieces of one long tape
+"""
+import codecs
+import collections
+import concurrent.futures
+import itertools
+import mmap
+import os
+import sys
+
+import machine
+
+kPARALLEL_CHUNK = 4096
+
+# machine shipped to each worker process by the pool initializer
+_worker_machine = None
+
+
+def _init_worker(compiled):
+    global _worker_machine
+    _worker_machine = compiled
+
+
+def _run_chunk(tapes: list) -> list:
+    return [accepts(_worker_machine, tape) for tape in tapes]
+
+
+def _map_piece(piece: tuple) -> tuple:
+    tape, lead = piece
+    compiled = _worker_machine
+    if lead is None:
+        starts = [compiled.start]
+    else:
+        # only states entered on the symbol before the piece are candidates
+        k = len(compiled.classes)
+        try:
+            a = compiled.symbol_map[lead]
+        except KeyError as e:
+            raise machine.InvalidCharacterInTape(*e.args)
+        starts = sorted(set(compiled.table[q * k + a] for q in range(len(compiled.state_labels))))
+    return starts, compiled.state_map(tape, starts)
+
+
+def _utf8_inside(mm, b: int) -> bool:
+    # continuation byte
+    return mm[b] & 0xC0 == 0x80
+
+
+def _never_inside(mm, b: int) -> bool:
+    return False
+
+
+def _code_units(tape, mm) -> tuple:
+    """
+    how the bytes of a file tape are laid out in characters
+
+    :param tape: FileTape
+    :param mm: the mapped file
+    :return: (code unit width in bytes, callable (mm, offset) -> True
+        when the unit there is inside a character, encoding the
+        pieces after the first are decoded with, length of the byte
+        order mark at the top of the file that the codec drops)
+    """
+    name = codecs.lookup(tape.encoding).name
+    if name == "utf-8-sig":
+        # later pieces are decoded without the mark, a U+FEFF there is text
+        return 1, _utf8_inside, "utf-8", len(codecs.BOM_UTF8) if mm[0:3] == codecs.BOM_UTF8 else 0
+    if name in ("utf-8", "ascii"):
+        return 1, _utf8_inside, tape.encoding, 0
+    if name == "iso8859-1":
+        return 1, _never_inside, tape.encoding, 0
+    for family, width, marks in (("utf-16", 2, (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)),
+                                 ("utf-32", 4, (codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE))):
+        if name == family:
+            # byte order from the mark at the top of the file, native without
+            # one, later pieces have no mark so they are given the order
+            bom = mm[0:width]
+            order = "little" if bom == marks[0] else "big" if bom == marks[1] else sys.byteorder
+            encoding = "{0}-{1}".format(family, "le" if order == "little" else "be")
+            mark = width if bom in marks else 0
+        elif name in (family + "-le", family + "-be"):
+            order = "little" if name.endswith("le") else "big"
+            encoding = tape.encoding
+            mark = 0
+        else:
+            continue
+        if width == 4:
+            return width, _never_inside, encoding, mark
+        # low surrogate, the second half of a pair
+        return width, lambda m, b: 0xDC00 <= int.from_bytes(m[b:b + 2], order) <= 0xDFFF, encoding, mark
+    raise ValueError("no character boundaries known for encoding", tape.encoding)
+
+
+def split_tape(tape, pieces: int) -> list:
+    """
+    cuts a tape into consecutive pieces, each paired with the
+    symbol just before it (None for the first piece). File tapes
+    are cut on character boundaries without being read, they
+    must be in UTF-8, UTF-16, UTF-32, ASCII or Latin-1
+
+    :param tape: str, Tape or FileTape
+    :param pieces: number of pieces wanted
+    :return: list of (piece, lead symbol)
+    """
+    if isinstance(tape, machine.FileTape):
+        with open(tape.filepath, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            stop = size if tape.stop is None else min(tape.stop, size)
+            if stop <= tape.start:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                width, inside, encoding, mark = _code_units(tape, mm)
+                # the mark only counts when the tape starts at the top of the file,
+                # it stays in the first piece whose codec drops it
+                first = tape.start + mark if tape.start == 0 else tape.start
+                if stop <= first:
+                    return []
+                bounds = [tape.start]
+                for i in range(1, pieces):
+                    b = first + (stop - first) * i // pieces
+                    # whole code units, and never inside a character
+                    b += -(b - first) % width
+                    while b < stop and inside(mm, b):
+                        b += width
+                    bounds.append(max(min(b, stop), bounds[-1]) if b > first else tape.start)
+                bounds.append(stop)
+                ret = list()
+                for b, e in zip(bounds, bounds[1:]):
+                    if b == e:
+                        continue
+                    lead = None
+                    if b > tape.start:
+                        j = b - width
+                        while j > first and inside(mm, j):
+                            j -= width
+                        lead = mm[j:b].decode(encoding)
+                    ret.append((machine.FileTape(tape.filepath, tape.encoding if b == tape.start else encoding,
+                                                 tape.chunk_size, b, e), lead))
+                return ret
+    text = tape if isinstance(tape, str) else str(tape)
+    bounds = [len(text) * i // pieces for i in range(pieces + 1)]
+    return [(text[b:e], text[b - 1] if b > 0 else None)
+            for b, e in zip(bounds, bounds[1:]) if b != e]
+
+
+def accepts(compiled, tape):
+    """
+    accept-only run that hands back an invalid character
+    instead of raising it, the per tape result of an executor
+
+    :param compiled: CompiledDFA, or anything with accepts(tape)
+    :param tape: tape to run
+    :return: True, False or the InvalidCharacterInTape raised
+    """
+    try:
+        return compiled.accepts(tape)
+    except machine.InvalidCharacterInTape as e:
+        return e
+
+
+class ParallelExecutor:
+    """
+    runs tapes on a pool of worker processes, the machine is
+    sent to every worker once when the pool starts and tapes
+    are handed out in chunks
+
+    results are True or False for each tape, or the
+    InvalidCharacterInTape raised by the tape
+    """
+    def __init__(self, compiled, workers: int = None, chunk_size: int = kPARALLEL_CHUNK):
+        """
+        :param compiled: CompiledDFA, or anything with accepts(tape)
+        :param workers: number of processes, defaults to the cpu count
+        :param chunk_size: tapes per unit of work
+        """
+        self.compiled = compiled
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(compiled,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __chunks(self, tapes):
+        tapes = iter(tapes)
+        while True:
+            chunk = list(itertools.islice(tapes, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def map(self, tapes):
+        """
+        results in input order, at most two chunks per worker
+        are in flight so memory stays bounded on long inputs
+
+        :param tapes: iterable of tapes
+        :return: generator of (tape, result) pairs
+        """
+        pending = collections.deque()
+        for chunk in self.__chunks(tapes):
+            pending.append((chunk, self.pool.submit(_run_chunk, chunk)))
+            if len(pending) >= 2 * self.workers:
+                chunk, future = pending.popleft()
+                yield from zip(chunk, future.result())
+        while pending:
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
+
+    def map_unordered(self, tapes):
+        """
+        results as soon as their chunk finishes
+
+        :param tapes: iterable of tapes
+        :return: generator of (input index, tape, result)
+        """
+        pending = dict()
+        offset = 0
+        chunks = self.__chunks(tapes)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * self.workers:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self.pool.submit(_run_chunk, chunk)] = (offset, chunk)
+                offset += len(chunk)
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                start, chunk = pending.pop(future)
+                for i, result in enumerate(future.result()):
+                    yield start + i, chunk[i], result
+
+    def run(self, tape, pieces: int = None) -> int:
+        """
+        speculative run of one long tape, every piece but the first
+        is run on a worker from each state it could be entered in,
+        then the per piece state maps are composed in order
+
+        needs a CompiledDFA
+
+        :param tape: str, Tape or FileTape
+        :param pieces: defaults to one per worker
+        :return: index of the final state
+        """
+        state = self.compiled.start
+        for starts, ends in self.pool.map(_map_piece, split_tape(tape, pieces or self.workers)):
+            state = ends[starts.index(state)]
+        return state
+
+    def accepts(self, tape, pieces: int = None) -> bool:
+        """
+        :param tape: str, Tape or FileTape
+        :param pieces: defaults to one per worker
+        :return: True if the machine accepts the tape
+        """
+        return self.compiled.accept[self.run(tape, pieces)] == 1
@@ -0,0 +1,124 @@
+"""
+several machines run over a tape in one pass, as a product
+automaton whose states are only built when a tape reaches them
+"""
+import array
+
+import machine
+
+kPRODUCT_MASK = "mask"
+kPRODUCT_UNION = "union"
+kPRODUCT_INTERSECTION = "intersection"
+kPRODUCT_DIFFERENCE = "difference"
+# component state of a machine that read a symbol outside its alphabet
+kDEAD = -1
+
+
+class Product:
+    """
+    product of K machines, a product state is the tuple of the
+    component states. Transitions are computed the first time a
+    tape takes them and kept in one flat table like CompiledDFA,
+    -1 marking a transition not built yet
+
+    the alphabet is the union of the machines' alphabets, a
+    machine that reads a symbol it does not have rejects. Symbols
+    that fall in the same class of every machine share a column
+    """
+    def __init__(self, machines: list):
+        """
+        :param machines: DFA, CompiledDFA or NFAlambda instances,
+            NFA-lambdas are converted first
+        """
+        self.machines = list()
+        for M in machines:
+            if isinstance(M, machine.NFAlambda):
+                M = M.convert()
+            self.machines.append(M if isinstance(M, machine.CompiledDFA) else M.compile())
+        self.symbols = sorted(set().union(*(c.symbols for c in self.machines)))
+        # a product class is a symbol's class in every machine
+        registry = dict()
+        self.symbol_map = dict()
+        for a in self.symbols:
+            key = tuple(c.symbol_map.get(a, kDEAD) for c in self.machines)
+            self.symbol_map[a] = registry.setdefault(key, len(registry))
+        self.classes = machine._symbol_classes(self.symbols, self.symbol_map)
+        # per machine, product class to its own class
+        self._translate = [[c.symbol_map.get(x[0], kDEAD) for x in self.classes] for c in self.machines]
+        self.states = list()
+        self.registry = dict()
+        self.accept = list()
+        self.table = array.array("i")
+        self.start = self.__state(tuple(c.start for c in self.machines))
+
+    def __state(self, components: tuple) -> int:
+        i = self.registry.get(components)
+        if i is not None:
+            return i
+        i = self.registry[components] = len(self.states)
+        self.states.append(components)
+        mask = 0
+        for j, (c, q) in enumerate(zip(self.machines, components)):
+            if q != kDEAD and c.accept[q] == 1:
+                mask |= 1 << j
+        self.accept.append(mask)
+        self.table.extend([-1] * len(self.classes))
+        return i
+
+    def __expand(self, state: int, a: int) -> int:
+        components = list()
+        for c, translate, q in zip(self.machines, self._translate, self.states[state]):
+            b = translate[a]
+            if q == kDEAD or b == kDEAD:
+                components.append(kDEAD)
+            else:
+                components.append(c.table[q * len(c.classes) + b])
+        successor = self.__state(tuple(components))
+        self.table[state * len(self.classes) + a] = successor
+        return successor
+
+    def run(self, tape) -> int:
+        """
+        :param tape: str, Tape or any iterable of symbols
+        :return: index of the final product state
+        """
+        table = self.table
+        symbol_map = self.symbol_map
+        k = len(self.classes)
+        state = self.start
+        chunks = machine._chunks(tape)
+        try:
+            for chunk in chunks:
+                for char in chunk:
+                    a = symbol_map[char]
+                    successor = table[state * k + a]
+                    if successor < 0:
+                        successor = self.__expand(state, a)
+                    state = successor
+        except KeyError as e:
+            raise machine.InvalidCharacterInTape(*e.args)
+        return state
+
+    def mask(self, tape) -> int:
+        """
+        :param tape: str, Tape or any iterable of symbols
+        :return: bitmask, bit i set if machines[i] accepts the tape
+        """
+        return self.accept[self.run(tape)]
+
+    def verdicts(self, tape) -> dict:
+        """
+        every verdict from one pass over the tape
+
+        :param tape: str, Tape or any iterable of symbols
+        :return: dict with the accept mask, union (any machine
+            accepts), intersection (all accept) and difference
+            (the first machine accepts and no other does)
+        """
+        mask = self.mask(tape)
+        ret = dict()
+        ret[kPRODUCT_MASK] = mask
+        ret[kPRODUCT_UNION] = mask != 0
+        ret[kPRODUCT_INTERSECTION] = mask == (1 << len(self.machines)) - 1
+        ret[kPRODUCT_DIFFERENCE] = mask == 1
+        return ret
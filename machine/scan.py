@@ -0,0 +1,218 @@
+"""
+grep style scanning, every place in a text where a substring
+is accepted by the machine, found in one pass over the text
+"""
+import array
+
+import machine
+
+
+class _MaskLabels:
+    """
+    names of the states of a search automaton, made from the
+    subset mask of a state when it is looked up
+    """
+    __slots__ = ("label", "masks")
+
+    def __init__(self, label, masks: list):
+        self.label = label
+        self.masks = masks
+
+    def __getitem__(self, state: int) -> str:
+        return self.label(self.masks[state])
+
+    def __len__(self):
+        return len(self.masks)
+
+
+def _subset_machine(compiled: machine.CompiledDFA, start: int, step, accepting, label) -> machine.CompiledDFA:
+    """
+    worklist subset construction straight into compiled form,
+    over the symbol classes of the machine it is built from
+
+    :param compiled: machine whose symbols and classes are used
+    :param start: mask of the start subset
+    :param step: callable (mask, class index) -> mask
+    :param accepting: callable mask -> bool
+    :param label: callable mask -> state name
+    :return: CompiledDFA over the reachable subsets
+    """
+    k = len(compiled.classes)
+    registry = {start: 0}
+    masks = [start]
+    table = array.array("i")
+    i = 0
+    while i < len(masks):
+        mask = masks[i]
+        for a in range(k):
+            successor = step(mask, a)
+            j = registry.get(successor)
+            if j is None:
+                j = registry[successor] = len(masks)
+                masks.append(successor)
+            table.append(j)
+        i += 1
+    ret = machine.CompiledDFA()
+    ret.symbols = compiled.symbols
+    ret.classes = compiled.classes
+    ret.symbol_map = dict(compiled.symbol_map)
+    ret.table = table
+    ret.start = 0
+    ret.accept = bytes(1 if accepting(m) else 0 for m in masks)
+    ret.state_labels = _MaskLabels(label, masks)
+    return ret.freeze()
+
+
+class Scanner:
+    """
+    finds the substrings of a text the machine accepts. The
+    search automaton for Σ*·L is built once, it is the machine
+    with a fresh copy of the start state joining at every
+    position, and its accepting states mark the ends of matches
+
+    characters outside the alphabet cannot be inside a match,
+    the search restarts after them
+    """
+    def __init__(self, M):
+        """
+        :param M: DFA, CompiledDFA or NFAlambda, NFA-lambdas are
+            converted first
+        """
+        if isinstance(M, machine.NFAlambda):
+            M = M.convert()
+        self.compiled = M if isinstance(M, machine.CompiledDFA) else M.compile()
+        c = self.compiled
+        k = len(c.classes)
+        n = len(c.state_labels)
+        self._start_mask = 1 << c.start
+        self._accept_mask = sum(1 << q for q in range(n) if c.accept[q] == 1)
+        self._succ = [1 << c.table[i] for i in range(n * k)]
+        self._pred = [[0] * n for _ in range(k)]
+        for q in range(n):
+            for a in range(k):
+                self._pred[a][c.table[q * k + a]] |= 1 << q
+        # states from which an accepting state can still be reached
+        self.live = bytes(x != machine.kFIXED_REJECT for x in c.fixed())
+        # names of subset states, see Node.set2node
+        self._braced = not machine.Node.prefix_free(c.state_labels)
+        self.search = _subset_machine(c, self._start_mask, self.__forward, self.__ends_match, self.__label)
+        self._reverse = None
+
+    def __label(self, mask: int) -> str:
+        return machine.Node.set2node({self.compiled.state_labels[q] for q in machine._bits(mask)}, self._braced)
+
+    def __forward(self, mask: int, a: int) -> int:
+        k = len(self.compiled.classes)
+        ret = self._start_mask
+        for q in machine._bits(mask):
+            ret |= self._succ[q * k + a]
+        return ret
+
+    def __ends_match(self, mask: int) -> bool:
+        return mask & self._accept_mask != 0
+
+    def __backward(self, mask: int, a: int) -> int:
+        pred = self._pred[a]
+        ret = self._accept_mask
+        for q in machine._bits(mask):
+            ret |= pred[q]
+        return ret
+
+    def __starts_match(self, mask: int) -> bool:
+        return mask & self._start_mask != 0
+
+    def reverse(self) -> machine.CompiledDFA:
+        """
+        search automaton for the reversed language, run right to
+        left its accepting states mark the starts of matches.
+        Built the first time spans are asked for
+
+        :return: CompiledDFA
+        """
+        if self._reverse is None:
+            self._reverse = _subset_machine(self.compiled, self._accept_mask, self.__backward,
+                                            self.__starts_match, self.__label)
+        return self._reverse
+
+    def ends(self, text):
+        """
+        end offsets of every match, a single pass over the text
+
+        :param text: str, Tape or FileTape
+        :return: generator of offsets, in characters, just past the
+            last character of a match, 0 for an empty match at the top
+        """
+        search = self.search
+        table = search.table
+        symbol_map = search.symbol_map
+        accept = search.accept
+        k = len(search.classes)
+        state = search.start
+        offset = 0
+        if accept[state]:
+            yield offset
+        chunks = machine._chunks(text)
+        for chunk in chunks:
+            for char in chunk:
+                a = symbol_map.get(char)
+                state = search.start if a is None else table[state * k + a]
+                offset += 1
+                if accept[state]:
+                    yield offset
+
+    def starts(self, text: str) -> bytearray:
+        """
+        :param text: str
+        :return: one byte per offset 0..len(text), 1 where a match starts
+        """
+        reverse = self.reverse()
+        table = reverse.table
+        symbol_map = reverse.symbol_map
+        accept = reverse.accept
+        k = len(reverse.classes)
+        state = reverse.start
+        ret = bytearray(len(text) + 1)
+        ret[len(text)] = accept[state]
+        for i in range(len(text) - 1, -1, -1):
+            a = symbol_map.get(text[i])
+            state = reverse.start if a is None else table[state * k + a]
+            ret[i] = accept[state]
+        return ret
+
+    def spans(self, text):
+        """
+        leftmost-longest matches that do not overlap. A reverse
+        pass marks where matches start, then each match is
+        extended from its start on the machine until it can no
+        longer accept
+
+        :param text: str or Tape
+        :return: generator of (start, end) offsets, text[start:end]
+        """
+        if isinstance(text, machine.Tape):
+            text = "".join(text.chunks())
+        c = self.compiled
+        table = c.table
+        symbol_map = c.symbol_map
+        k = len(c.classes)
+        starts = self.starts(text)
+        position = 0
+        while position <= len(text):
+            start = starts.find(1, position)
+            if start < 0:
+                return
+            state = c.start
+            end = start if c.accept[state] else -1
+            i = start
+            while i < len(text):
+                a = symbol_map.get(text[i])
+                if a is None:
+                    break
+                state = table[state * k + a]
+                i += 1
+                if not self.live[state]:
+                    break
+                if c.accept[state]:
+                    end = i
+            yield start, end
+            position = end if end > start else start + 1
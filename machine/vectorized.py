@@ -0,0 +1,100 @@
+"""
+numpy execution of a batch of tapes at once, every tape in the
+batch advances one symbol per column with a single gather
+
+requires numpy, see requirements-vectorized.txt
+"""
+try:
+    import numpy
+except ImportError:
+    raise ImportError("machine.vectorized needs numpy for batch execution, "
+                      "pip install -r requirements-vectorized.txt")
+
+import machine
+
+# columns run between checks for tapes whose verdict is fixed
+kCHECK_COLUMNS = 64
+
+
+def transition_matrix(compiled: machine.CompiledDFA) -> numpy.ndarray:
+    """
+    states x (classes + 1) matrix, the extra last column is the
+    padding symbol which leaves every state where it is
+
+    :param compiled: machine to tabulate
+    :return: int32 matrix of next states
+    """
+    n = len(compiled.state_labels)
+    k = len(compiled.classes)
+    matrix = numpy.empty((n, k + 1), dtype=numpy.int32)
+    matrix[:, :k] = numpy.asarray(compiled.table, dtype=numpy.int32).reshape(n, k)
+    matrix[:, k] = numpy.arange(n, dtype=numpy.int32)
+    return matrix
+
+
+def encode(compiled: machine.CompiledDFA, tapes: list) -> tuple:
+    """
+    encodes the tapes as rows of symbol classes, shorter tapes
+    are padded with the padding symbol
+
+    :param compiled: machine whose symbols are used
+    :param tapes: list of str
+    :return: (int32 array of tapes x longest tape, lengths)
+    """
+    k = len(compiled.classes)
+    lengths = numpy.fromiter((len(t) for t in tapes), dtype=numpy.int64, count=len(tapes))
+    width = int(lengths.max()) if len(tapes) else 0
+    encoded = numpy.full((len(tapes), width), k, dtype=numpy.int32)
+    codes = numpy.frombuffer("".join(tapes).encode("utf-32-le"), dtype=numpy.uint32)
+    if codes.size == 0:
+        return encoded, lengths
+
+    # code point to symbol class, -1 for characters outside the alphabet
+    top = max(int(codes.max()), max((ord(a) for a in compiled.symbols if len(a) == 1), default=0))
+    lookup = numpy.full(top + 1, -1, dtype=numpy.int32)
+    for a, i in compiled.symbol_map.items():
+        if len(a) == 1:
+            lookup[ord(a)] = i
+    symbols = lookup[codes]
+    invalid = numpy.flatnonzero(symbols < 0)
+    if invalid.size:
+        raise machine.InvalidCharacterInTape(chr(int(codes[invalid[0]])))
+
+    mask = numpy.arange(width) < lengths[:, None]
+    encoded[mask] = symbols
+    return encoded, lengths
+
+
+def accepts_batch(compiled: machine.CompiledDFA, tapes: list, matrix: numpy.ndarray = None) -> numpy.ndarray:
+    """
+    runs every tape of the batch together, one gather from the
+    transition matrix per column of the encoded batch. Tapes that
+    enter a dead state or an accept sink are dropped from the batch
+
+    :param compiled: machine to run
+    :param tapes: list of str
+    :param matrix: transition_matrix(compiled), built when not given
+    :return: bool array, entry i is True if tapes[i] is accepted
+    """
+    if matrix is None:
+        matrix = transition_matrix(compiled)
+    encoded, _ = encode(compiled, tapes)
+    flat = matrix.ravel()
+    width = matrix.shape[1]
+    fixed = numpy.frombuffer(compiled.fixed(), dtype=numpy.uint8)
+    final = numpy.empty(len(tapes), dtype=numpy.int32)
+    # tapes still running, dropped once their verdict is fixed
+    rows = numpy.arange(len(tapes))
+    states = numpy.full(len(tapes), compiled.start, dtype=numpy.int32)
+    for i in range(encoded.shape[1]):
+        if i % kCHECK_COLUMNS == 0:
+            running = fixed[states] == machine.kFIXED_OPEN
+            if not running.all():
+                final[rows[~running]] = states[~running]
+                rows, states = rows[running], states[running]
+                if rows.size == 0:
+                    break
+        states = flat[states * width + encoded[rows, i]]
+    final[rows] = states
+    accept = numpy.frombuffer(compiled.accept, dtype=numpy.uint8).astype(bool)
+    return accept[final]
@@ -0,0 +1,391 @@
+import machine
+import machine.binary
+import machine.parallel
+import simulator
+import asyncio
+import json
+import os
+import sys
+from typing import List
+
+kMACHINE_flag = "--machine"
+kUNIX_flag = "--unix"
+kHOST_flag = "--host"
+kPORT_flag = "--port"
+kPOLL_flag = "--poll"
+kCACHE_flag = simulator.kCACHE_flag
+kMIN_flag = simulator.kMIN_flag
+
+kDEFAULT_HOST = "127.0.0.1"
+kDEFAULT_PORT = 8570
+kDEFAULT_POLL = 1.0
+# bytes taken from a connection per read, every complete request
+# line in them is answered before the responses are written out
+kREAD_SIZE = 1 << 16
+
+kOP_ACCEPTS = "accepts"
+kOP_RUN = "run"
+kOP_MACHINES = "machines"
+kREQ_ID = "id"
+kREQ_OP = "op"
+kREQ_MACHINE = "machine"
+kREQ_TAPE = "tape"
+kREQ_TAPES = "tapes"
+kRESP_ERROR = "error"
+kRESP_STATE = "state"
+kHTTP_METHODS = (b"GET ", b"POST ")
+
+
+class UnknownMachine(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def errmsg(*args, **flags):
+    print(*args, file=sys.stderr, **flags)
+
+
+class Registry:
+    """
+    named compiled machines, each built once from its config
+    file and rebuilt when the file changes on disk
+    """
+    def __init__(self, cache_dir: str = None, minimize: bool = False):
+        """
+        :param cache_dir: compiled machine cache, see machine.binary
+        :param minimize: minimize every DFA before compiling it
+        """
+        self.cache_dir = cache_dir
+        self.minimize = minimize
+        self.sources = dict()
+        self.machines = dict()
+        self.mtimes = dict()
+        # NFA-lambdas kept between builds, so a reload converts incrementally
+        self.nfas = dict()
+
+    def build(self, filepath: str) -> machine.CompiledDFA:
+        """
+        :param filepath: .dfa or .nfal configuration
+        :return: compiled machine, NFA-lambdas are converted first
+        """
+        commands = dict()
+        nfa = None
+        if filepath.endswith("." + simulator.kNFAL_ext):
+            commands[simulator.kNFAL_flag] = filepath
+            nfa = self.nfas.setdefault(filepath, machine.NFAlambda())
+        else:
+            commands[simulator.kDFA_flag] = filepath
+        if self.cache_dir is not None:
+            commands[kCACHE_flag] = self.cache_dir
+        if self.minimize:
+            commands[kMIN_flag] = True
+        return simulator.batchmachine(commands, nfa)
+
+    def add(self, name: str, filepath: str):
+        """
+        :param name: name requests use for the machine
+        :param filepath: .dfa or .nfal configuration
+        """
+        mtime = os.stat(filepath).st_mtime_ns
+        self.machines[name] = self.build(filepath)
+        self.sources[name] = filepath
+        self.mtimes[name] = mtime
+
+    def get(self, name: str) -> machine.CompiledDFA:
+        try:
+            return self.machines[name]
+        except KeyError:
+            raise UnknownMachine(name)
+
+    def changed(self) -> list:
+        """
+        :return: names whose config file changed since it was built
+        """
+        ret = list()
+        for name, filepath in self.sources.items():
+            try:
+                if os.stat(filepath).st_mtime_ns != self.mtimes[name]:
+                    ret.append(name)
+            except OSError:
+                # file being replaced, try again on the next poll
+                pass
+        return ret
+
+    async def watch(self, interval: float):
+        """
+        polls the config files and rebuilds changed machines off
+        the event loop, a machine that fails to build keeps serving
+        its previous version
+
+        :param interval: seconds between polls
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(interval)
+            for name in self.changed():
+                filepath = self.sources[name]
+                try:
+                    await loop.run_in_executor(None, self.add, name, filepath)
+                    errmsg("Reloaded: ", name, filepath)
+                except Exception as e:
+                    # whatever the edit broke, keep watching every machine
+                    errmsg("Reload failed: ", name, filepath, type(e).__name__, e)
+                    try:
+                        self.mtimes[name] = os.stat(filepath).st_mtime_ns
+                    except OSError:
+                        pass
+
+
+def answer(registry: Registry, request: dict) -> dict:
+    """
+    :param registry: machines to run requests against
+    :param request: decoded request, op, machine and tape or tapes
+    :return: response, carrying the request id when one was given
+    """
+    response = dict()
+    if kREQ_ID in request:
+        response[kREQ_ID] = request[kREQ_ID]
+    try:
+        op = request.get(kREQ_OP, kOP_ACCEPTS)
+        if op == kOP_MACHINES:
+            response[kOP_MACHINES] = {name: registry.sources[name] for name in sorted(registry.machines)}
+            return response
+        if op not in (kOP_ACCEPTS, kOP_RUN):
+            raise BadRequest("unknown op", op)
+        name = request.get(kREQ_MACHINE)
+        if name is not None and not isinstance(name, str):
+            raise BadRequest("not a string", kREQ_MACHINE)
+        compiled = registry.get(name)
+        if kREQ_TAPES in request:
+            # batch, one result per tape
+            if not isinstance(request[kREQ_TAPES], list) or not all(isinstance(x, str) for x in request[kREQ_TAPES]):
+                raise BadRequest("not a list of strings", kREQ_TAPES)
+            response[machine.kEXEC_ACCEPT] = [machine.parallel.accepts(compiled, tape) for tape in request[kREQ_TAPES]]
+            for i, accepted in enumerate(response[machine.kEXEC_ACCEPT]):
+                if isinstance(accepted, machine.InvalidCharacterInTape):
+                    response[machine.kEXEC_ACCEPT][i] = None
+                    response.setdefault(kRESP_ERROR, dict())[i] = ["invalid character"] + list(accepted.args)
+        elif kREQ_TAPE in request:
+            if not isinstance(request[kREQ_TAPE], str):
+                raise BadRequest("not a string", kREQ_TAPE)
+            state = compiled.run(request[kREQ_TAPE])
+            response[machine.kEXEC_ACCEPT] = compiled.accept[state] == 1
+            if op == kOP_RUN:
+                response[kRESP_STATE] = compiled.state_labels[state]
+        else:
+            raise BadRequest("missing", kREQ_TAPE)
+    except UnknownMachine as e:
+        response[kRESP_ERROR] = ["unknown machine"] + list(e.args)
+    except BadRequest as e:
+        response[kRESP_ERROR] = list(e.args)
+    except machine.InvalidCharacterInTape as e:
+        response[kRESP_ERROR] = ["invalid character"] + list(e.args)
+    return response
+
+
+def respond(registry: Registry, line: bytes) -> bytes:
+    """
+    :param registry: machines to run requests against
+    :param line: one JSON request
+    :return: one JSON response line
+    """
+    try:
+        request = json.loads(line.decode("utf-8"))
+        if not isinstance(request, dict):
+            raise ValueError(line)
+        response = answer(registry, request)
+    except ValueError:
+        response = {kRESP_ERROR: ["malformed request"]}
+    return (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def serve_lines(registry: Registry, first: bytes, reader, writer):
+    """
+    line protocol, one JSON request per line and one JSON
+    response per line in the same order. Everything a read
+    returns is answered together and written once, so
+    pipelining clients are not held up by a round trip each
+    """
+    pending = first
+    while True:
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        out = [respond(registry, line) for line in lines if line.strip()]
+        if out:
+            writer.write(b"".join(out))
+            await writer.drain()
+        data = await reader.read(kREAD_SIZE)
+        if not data:
+            if pending.strip():
+                writer.write(respond(registry, pending))
+                await writer.drain()
+            return
+        pending += data
+
+
+async def serve_http(registry: Registry, first: bytes, reader, writer):
+    """
+    minimal HTTP/1.1 with keep-alive, POST / takes the same JSON
+    request as the line protocol, a JSON list of them is answered
+    with a list, GET / lists the machines
+    """
+    line = first
+    while line:
+        method = line.split(b" ", 1)[0]
+        headers = dict()
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = header.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0"))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # the body cannot be found, so the connection cannot go on
+            payload = json.dumps({kRESP_ERROR: ["malformed content-length"]}).encode("utf-8")
+            writer.write("HTTP/1.1 400 Bad Request\r\nContent-Type: application/json\r\nContent-Length: {0}\r\n"
+                         "Connection: close\r\n\r\n".format(len(payload)).encode("latin-1") + payload)
+            await writer.drain()
+            break
+        body = await reader.readexactly(length)
+        status = "200 OK"
+        try:
+            if method == b"GET":
+                response = answer(registry, {kREQ_OP: kOP_MACHINES})
+            else:
+                request = json.loads(body.decode("utf-8"))
+                if isinstance(request, list):
+                    response = [answer(registry, x) for x in request]
+                elif isinstance(request, dict):
+                    response = answer(registry, request)
+                else:
+                    raise ValueError(body)
+        except ValueError:
+            status = "400 Bad Request"
+            response = {kRESP_ERROR: ["malformed request"]}
+        payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        writer.write("HTTP/1.1 {0}\r\nContent-Type: application/json\r\nContent-Length: {1}\r\n\r\n"
+                     .format(status, len(payload)).encode("latin-1") + payload)
+        await writer.drain()
+        if headers.get("connection", "").lower() == "close":
+            break
+        line = await reader.readline()
+
+
+def handler(registry: Registry):
+    """
+    :param registry: machines to serve
+    :return: connection callback, the first line of a connection
+        picks HTTP or the line protocol
+    """
+    async def handle(reader, writer):
+        try:
+            first = await reader.readline()
+            if first.startswith(kHTTP_METHODS):
+                await serve_http(registry, first, reader, writer)
+            else:
+                await serve_lines(registry, first, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+def parsecommands(argv: List[str]) -> dict:
+    commands = dict()
+    commands[kMACHINE_flag] = list()
+    for index, flag in enumerate(argv):
+        if flag != kMACHINE_flag:
+            continue
+        try:
+            name, _, filepath = argv[index + 1].partition("=")
+        except IndexError:
+            raise simulator.FilePath_NotSupplied_Exception(kMACHINE_flag)
+        if not filepath:
+            # bare path, named after the file
+            name, filepath = os.path.splitext(os.path.basename(name))[0], name
+        filepath = simulator.pathfix(filepath)
+        if not os.path.isfile(filepath):
+            raise simulator.FilePath_DNE_Exception(kMACHINE_flag, filepath)
+        commands[kMACHINE_flag].append((name, filepath))
+    if not commands[kMACHINE_flag]:
+        raise simulator.NoMachineException
+
+    if kUNIX_flag in argv:
+        index = argv.index(kUNIX_flag)
+        try:
+            commands[kUNIX_flag] = argv[index + 1]
+        except IndexError:
+            raise simulator.FilePath_NotSupplied_Exception(kUNIX_flag)
+    commands[kHOST_flag] = kDEFAULT_HOST
+    commands[kPORT_flag] = kDEFAULT_PORT
+    commands[kPOLL_flag] = kDEFAULT_POLL
+    for flag, kind in ((kHOST_flag, str), (kPORT_flag, int), (kPOLL_flag, float)):
+        if flag in argv:
+            index = argv.index(flag)
+            try:
+                commands[flag] = kind(argv[index + 1])
+            except (IndexError, ValueError):
+                raise simulator.NoInputException(flag)
+
+    if kCACHE_flag in argv:
+        index = argv.index(kCACHE_flag)
+        if index + 1 < len(argv) and not argv[index + 1].startswith("--"):
+            commands[kCACHE_flag] = simulator.pathfix(argv[index + 1])
+        else:
+            commands[kCACHE_flag] = machine.binary.kCACHE_DIR
+    if kMIN_flag in argv:
+        commands[kMIN_flag] = True
+    return commands
+
+
+if __name__ == "__main__":
+    try:
+        commands = parsecommands(sys.argv)
+    except simulator.NoMachineException:
+        errmsg("Usage: server", kMACHINE_flag, "[name=]<filepath> ... [", kUNIX_flag, "<filepath> |",
+               kHOST_flag, "<host>", kPORT_flag, "<port> ] [", kPOLL_flag, "<seconds> ] [", kCACHE_flag,
+               "[<dirpath>] ] [", kMIN_flag, "]")
+        exit(-1)
+    except simulator.FilePath_NotSupplied_Exception as e:
+        errmsg("Filepath Not Supplied: ", *e.args)
+        exit(-2)
+    except simulator.FilePath_DNE_Exception as e:
+        errmsg("Filepath does not exist: ", *e.args)
+        exit(-3)
+    except simulator.NoInputException as e:
+        errmsg("No input provided: ", *e.args)
+        exit(-4)
+
+    registry = Registry(commands.get(kCACHE_flag), kMIN_flag in commands)
+    for name, filepath in commands[kMACHINE_flag]:
+        registry.add(name, filepath)
+        errmsg("Loaded: ", name, filepath)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    if kUNIX_flag in commands:
+        server = loop.run_until_complete(asyncio.start_unix_server(handler(registry), commands[kUNIX_flag]))
+        errmsg("Listening: ", commands[kUNIX_flag])
+    else:
+        server = loop.run_until_complete(
+            asyncio.start_server(handler(registry), commands[kHOST_flag], commands[kPORT_flag]))
+        errmsg("Listening: ", "{0}:{1}".format(commands[kHOST_flag], commands[kPORT_flag]))
+    watcher = loop.create_task(registry.watch(commands[kPOLL_flag]))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.cancel()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+    exit(0)
@@ -1,4 +1,9 @@
 import machine
+import machine.parallel
+import machine.binary
+import machine.scan
+import machine.equivalence
+import json
 import os
 import sys
 from typing import List
@@ -7,6 +12,23 @@ kDFA_flag = "--dfa"
 kNFAL_flag = "--nfal"
 kCONV_flag = '--conv'
 kTAPE_flag = 'tape'
+kBATCH_flag = '--batch'
+kBATCH_stdin = '-'
+kTAPEFILE_flag = '--tapefile'
+kMIN_flag = '--min'
+kJOBS_flag = '--jobs'
+kCACHE_flag = '--cache'
+kSTATS_flag = '--stats'
+kTRACE_flag = '--trace'
+kTRACEFILE_flag = '--trace-file'
+kTRACEFILE_stdout = '-'
+kTRACE_tail = 'trace_tail'
+kSCAN_flag = '--scan'
+kSCAN_ends = 'ends'
+kSCAN_spans = 'spans'
+kEQUIV_flag = '--equiv'
+kEXPORT_flag = '--export'
+kCOMPACT_flag = '--compact'
 kDFA_ext = "dfa"
 kNFAL_ext = "nfal"
 
@@ -45,6 +67,8 @@ def pathfix(_str: str) -> str:
         _str = _str.split("\\")
     elif mac_style:
         _str = _str.split(":")
+    else:
+        _str = [_str]
     _str = [os.path.expanduser(x) for x in _str]
     return os.path.join(*_str)
 
@@ -83,6 +107,9 @@ def parsecommands(argv: List[str]) -> dict:
             raise ConversionWithoutNFA_Exception
         index = argv.index(kCONV_flag)
         try:
+            if argv[index + 1].startswith("--"):
+                # next argument is another flag
+                raise IndexError
             filepath = pathfix(argv[index + 1])
             commands[kCONV_flag] = filepath
         except IndexError:
@@ -91,8 +118,109 @@ def parsecommands(argv: List[str]) -> dict:
             filename = commands[kNFAL_flag].rpartition(".")[0]
             commands[kCONV_flag] = "{0}.{1}".format(filename, kDFA_ext)
 
+    # collect counters and timers
+    if kSTATS_flag in argv:
+        commands[kSTATS_flag] = machine.Stats()
+
+    # trace verbosity, none | verdict | tail [n] | full
+    if kTRACE_flag in argv:
+        index = argv.index(kTRACE_flag)
+        try:
+            commands[kTRACE_flag] = machine.kTRACE_LEVELS[argv[index + 1]]
+        except (IndexError, KeyError):
+            raise NoInputException(kTRACE_flag, *machine.kTRACE_LEVELS)
+        commands[kTRACE_tail] = machine.kTRACE_TAIL_STEPS
+        if index + 2 < len(argv) and argv[index + 2].isdigit():
+            commands[kTRACE_tail] = int(argv[index + 2])
+
+    # stream the trace as JSON lines instead of printing it
+    if kTRACEFILE_flag in argv:
+        index = argv.index(kTRACEFILE_flag)
+        try:
+            filepath = argv[index + 1]
+        except IndexError:
+            raise FilePath_NotSupplied_Exception(kTRACEFILE_flag)
+        commands[kTRACEFILE_flag] = filepath if filepath == kTRACEFILE_stdout else pathfix(filepath)
+
+    # minimization stage
+    if kMIN_flag in argv:
+        commands[kMIN_flag] = True
+
+    # worker processes for batch and file tapes
+    if kJOBS_flag in argv:
+        index = argv.index(kJOBS_flag)
+        try:
+            commands[kJOBS_flag] = int(argv[index + 1])
+        except (IndexError, ValueError):
+            raise NoInputException(kJOBS_flag)
+
+    # compiled machine cache for batch runs
+    if kCACHE_flag in argv:
+        index = argv.index(kCACHE_flag)
+        if index + 1 < len(argv) and not argv[index + 1].startswith("--"):
+            commands[kCACHE_flag] = pathfix(argv[index + 1])
+        else:
+            commands[kCACHE_flag] = machine.binary.kCACHE_DIR
+
+    # rewrite the configuration, JSON or compact
+    if kEXPORT_flag in argv:
+        index = argv.index(kEXPORT_flag)
+        try:
+            commands[kEXPORT_flag] = pathfix(argv[index + 1])
+        except IndexError:
+            raise FilePath_NotSupplied_Exception(kEXPORT_flag)
+        commands[kCOMPACT_flag] = kCOMPACT_flag in argv
+        return commands
+
+    # compare the machine's language with another configuration
+    if kEQUIV_flag in argv:
+        index = argv.index(kEQUIV_flag)
+        try:
+            filepath = pathfix(argv[index + 1])
+            if os.path.isfile(filepath):
+                commands[kEQUIV_flag] = filepath
+            else:
+                raise FilePath_DNE_Exception(kEQUIV_flag, filepath)
+        except IndexError:
+            raise FilePath_NotSupplied_Exception(kEQUIV_flag)
+        return commands
+
+    # grep style scan, report match ends or leftmost-longest spans
+    if kSCAN_flag in argv:
+        index = argv.index(kSCAN_flag)
+        commands[kSCAN_flag] = kSCAN_ends
+        if index + 1 < len(argv) and argv[index + 1] in (kSCAN_ends, kSCAN_spans):
+            commands[kSCAN_flag] = argv[index + 1]
+
+    # setup batch input, tapes come from a file or stdin
+    if kBATCH_flag in argv:
+        index = argv.index(kBATCH_flag)
+        if index + 1 < len(argv) and not argv[index + 1].startswith("--"):
+            filepath = argv[index + 1]
+            if filepath != kBATCH_stdin:
+                filepath = pathfix(filepath)
+                if not os.path.isfile(filepath):
+                    raise FilePath_DNE_Exception(kBATCH_flag, filepath)
+            commands[kBATCH_flag] = filepath
+        else:
+            commands[kBATCH_flag] = kBATCH_stdin
+        return commands
+
+    # tape held in a file, streamed rather than loaded
+    if kTAPEFILE_flag in argv:
+        index = argv.index(kTAPEFILE_flag)
+        try:
+            filepath = pathfix(argv[index + 1])
+            if os.path.isfile(filepath):
+                commands[kTAPEFILE_flag] = filepath
+            else:
+                raise FilePath_DNE_Exception(kTAPEFILE_flag, filepath)
+        except IndexError:
+            raise FilePath_NotSupplied_Exception(kTAPEFILE_flag)
+        return commands
+
     # check for an input string
-    if not argv[1] in [kCONV_flag, kDFA_flag, kNFAL_flag]:
+    if not argv[1].startswith("--"):
         commands[kTAPE_flag] = argv[1]
     else:
         raise NoInputException
@@ -100,6 +228,253 @@ def parsecommands(argv: List[str]) -> dict:
     return commands
 
 
+def readtapes(source: str):
+    """
+    yields one tape per line of the source, without
+    the line ending
+
+    :param source: filepath or kBATCH_stdin
+    """
+    if source == kBATCH_stdin:
+        f = sys.stdin
+    else:
+        f = open(source, encoding='utf-8')
+    try:
+        for line in f:
+            yield line.rstrip("\r\n")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def runbatch(compiled: machine.CompiledDFA, source: str, jobs: int = 1):
+    """
+    runs every tape from the source against one compiled
+    machine, writing a JSON result line per tape to stdout
+
+    :param compiled: machine to run the tapes on
+    :param source: filepath or kBATCH_stdin
+    :param jobs: worker processes, 1 runs in this process
+    """
+    executor = None
+    if jobs > 1:
+        executor = machine.parallel.ParallelExecutor(compiled, workers=jobs)
+        outcomes = executor.map(readtapes(source))
+    else:
+        outcomes = ((tape, machine.parallel.accepts(compiled, tape)) for tape in readtapes(source))
+    try:
+        for tape, accepted in outcomes:
+            result = {machine.kEXEC_TAPE: tape}
+            if isinstance(accepted, machine.InvalidCharacterInTape):
+                result[machine.kEXEC_ACCEPT] = False
+                result["invalid"] = [str(x) for x in accepted.args]
+            else:
+                result[machine.kEXEC_ACCEPT] = accepted
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if executor is not None:
+            executor.close()
+    sys.stdout.flush()
+
+
+def printstats(commands: dict):
+    """
+    writes the collected stats to stderr as JSON when asked to
+
+    :param commands: parsed command line
+    """
+    if kSTATS_flag in commands:
+        errmsg(json.dumps(commands[kSTATS_flag].report(), sort_keys=True, indent=4))
+
+
+def batchmachine(commands: dict, nfa: machine.NFAlambda = None) -> machine.CompiledDFA:
+    """
+    builds the compiled machine for a batch run, when a cache is
+    given a previous build of the same source file is reused and
+    parsing, validation and conversion are skipped entirely
+
+    :param commands: parsed command line
+    :param nfa: NFAlambda that converted an earlier version of the
+        file, it is configured again so only what the edit changed
+        is converted
+    :return: compiled machine
+    """
+    def build() -> machine.CompiledDFA:
+        if kNFAL_flag in commands:
+            N = machine.NFAlambda(stats=commands.get(kSTATS_flag)) if nfa is None else nfa
+            N.config(commands[kNFAL_flag])
+            M = minimize(N.convert(), commands)
+        elif kMIN_flag not in commands and machine.compact_kind(commands[kDFA_flag]) == machine.kCOMPACT_DFA:
+            # straight into the flat table, no per state dicts
+            return machine.load_compiled(commands[kDFA_flag], commands.get(kSTATS_flag))
+        else:
+            # configured outside the constructor so a bad file raises
+            # here instead of leaving an unconfigured machine behind
+            M = machine.DFA(stats=commands.get(kSTATS_flag))
+            M.config(commands[kDFA_flag])
+            M = minimize(M, commands)
+        return M.compile()
+
+    if kCACHE_flag not in commands:
+        compiled = build()
+    else:
+        if kNFAL_flag in commands:
+            source, stages = commands[kNFAL_flag], [kNFAL_ext]
+        else:
+            source, stages = commands[kDFA_flag], [kDFA_ext]
+        if kMIN_flag in commands:
+            stages.append(kMIN_flag)
+        compiled = machine.binary.cached(source, build, stages, commands[kCACHE_flag])
+    if kCONV_flag in commands:
+        # written from the compiled machine, so a cache hit writes it too
+        compiled.export(commands[kCONV_flag])
+    return compiled
+
+
+def streamtrace(M: machine.Machine, tape, commands: dict) -> dict:
+    """
+    writes the trace of a run as JSON lines to the trace file,
+    records are written as they are made so no trace is kept
+
+    :param M: DFA or NFAlambda to run
+    :param tape: tape to run
+    :param commands: parsed command line
+    :return: the closing verdict record
+    """
+    verdict = dict()
+
+    def records():
+        for record in M.trace(tape, max(commands.get(kTRACE_flag, machine.kTRACE_FULL), machine.kTRACE_VERDICT),
+                              commands[kTRACE_tail]):
+            if machine.kEXEC_ACCEPT in record:
+                verdict.update(record)
+            yield record
+
+    if commands[kTRACEFILE_flag] == kTRACEFILE_stdout:
+        machine.write_trace(records(), sys.stdout)
+    else:
+        with open(commands[kTRACEFILE_flag], "w+", encoding='utf-8') as f:
+            machine.write_trace(records(), f)
+    return verdict
+
+
+def runtape(M: machine.Machine, commands: dict):
+    """
+    runs the tape from the commands on the machine, a file
+    tape is streamed through the compiled machine without
+    building an execution trace unless a trace file is given
+
+    :param M: DFA or NFAlambda to run
+    :param commands: parsed command line
+    """
+    commands.setdefault(kTRACE_tail, machine.kTRACE_TAIL_STEPS)
+    try:
+        if kTRACEFILE_flag in commands:
+            if kTAPEFILE_flag in commands:
+                tape = machine.FileTape(commands[kTAPEFILE_flag])
+            else:
+                tape = machine.Tape(commands[kTAPE_flag])
+            verdict = streamtrace(M, tape, commands)
+            errmsg("Accepted: ", verdict[machine.kEXEC_ACCEPT])
+        elif kTAPEFILE_flag in commands:
+            tape = machine.FileTape(commands[kTAPEFILE_flag])
+            jobs = commands.get(kJOBS_flag, 1)
+            if isinstance(M, machine.DFA) and jobs > 1:
+                # speculative run, pieces of the file on separate workers
+                with machine.parallel.ParallelExecutor(M.compile(), workers=jobs) as executor:
+                    print("Accepted: ", executor.accepts(tape))
+            else:
+                runner = M.compile() if isinstance(M, machine.DFA) else M
+                print("Accepted: ", runner.accepts(tape))
+            print("Tape: ", str(tape))
+        else:
+            M.load(machine.Tape(commands[kTAPE_flag]))
+            computation = M.exec(commands.get(kTRACE_flag, machine.kTRACE_FULL), commands[kTRACE_tail])
+            print("Accepted: ", computation["accepted"])
+            print("Tape: ", computation["tape"])
+            if commands.get(kTRACE_flag, machine.kTRACE_FULL) != machine.kTRACE_NONE:
+                print("Machine Execution:")
+                print(computation["output"])
+    except machine.InvalidCharacterInTape as e:
+        print("Tape contains invalid character", *[str(x) for x in e.args])
+        print("Allowed characters: ", M.alpha)
+
+
+def runscan(compiled: machine.CompiledDFA, commands: dict):
+    """
+    scans the tape for substrings the machine accepts, writing
+    a JSON line per match to stdout
+
+    :param compiled: machine to scan with
+    :param commands: parsed command line
+    """
+    scanner = machine.scan.Scanner(compiled)
+    if kTAPEFILE_flag in commands:
+        tape = machine.FileTape(commands[kTAPEFILE_flag])
+    else:
+        tape = machine.Tape(commands[kTAPE_flag])
+    if commands[kSCAN_flag] == kSCAN_spans:
+        text = "".join(tape.chunks())
+        for start, end in scanner.spans(text):
+            result = {"start": start, "end": end, "match": text[start:end]}
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    else:
+        for end in scanner.ends(tape):
+            sys.stdout.write(json.dumps({"end": end}) + "\n")
+    sys.stdout.flush()
+
+
+def loadmachine(filepath: str, commands: dict) -> machine.Machine:
+    """
+    :param filepath: .dfa or .nfal configuration
+    :param commands: parsed command line
+    :return: DFA or NFAlambda, chosen by the file extension
+    """
+    if filepath.endswith("." + kNFAL_ext):
+        return machine.NFAlambda(filepath, stats=commands.get(kSTATS_flag))
+    return machine.DFA(filepath, stats=commands.get(kSTATS_flag))
+
+
+def runequiv(commands: dict) -> bool:
+    """
+    decides whether the machine and the --equiv configuration
+    accept the same language, printing a shortest tape on which
+    they differ when they do not
+
+    :param commands: parsed command line
+    :return: True if the languages are equal
+    """
+    M = loadmachine(commands.get(kNFAL_flag) or commands[kDFA_flag], commands)
+    other = loadmachine(commands[kEQUIV_flag], commands)
+    tape = machine.equivalence.counterexample(M, other)
+    print("Equivalent: ", tape is None)
+    if tape is not None:
+        print("Counterexample: ", json.dumps(tape, ensure_ascii=False))
+        runner = M if isinstance(M, machine.NFAlambda) else M.compile()
+        try:
+            accepted = runner.accepts(tape)
+        except machine.InvalidCharacterInTape:
+            accepted = False
+        print("Accepted by: ", (commands.get(kNFAL_flag) or commands[kDFA_flag]) if accepted else commands[kEQUIV_flag])
+    return tape is None
+
+
+def minimize(M: machine.DFA, commands: dict) -> machine.DFA:
+    """
+    minimizes the DFA when asked to on the command line,
+    reporting the state count before and after
+
+    :param M: DFA to minimize
+    :param commands: parsed command line
+    :return: minimized DFA, or M itself
+    """
+    if kMIN_flag not in commands:
+        return M
+    Mmin = M.minimize()
+    errmsg("Minimized: ", len(M.states), "->", len(Mmin.states), "states")
+    return Mmin
+
+
 if __name__ == "__main__":
     commands = dict()
     try:
@@ -120,37 +495,51 @@ if __name__ == "__main__":
         errmsg("Usage: simulator <inputstring>", kNFAL_flag, "<filepath>", kCONV_flag, "[<filepath>]")
     # print(commands)
 
+    if kBATCH_flag in commands:
+        # build the machine once, then stream the tapes through it
+        runbatch(batchmachine(commands), commands[kBATCH_flag], commands.get(kJOBS_flag, 1))
+        printstats(commands)
+        exit(0)
+
+    if kEXPORT_flag in commands:
+        # format conversion, the machine is written back out as loaded
+        if kNFAL_flag in commands:
+            M = loadmachine(commands[kNFAL_flag], commands)
+        else:
+            M = minimize(loadmachine(commands[kDFA_flag], commands), commands)
+        M.export(commands[kEXPORT_flag], compact=commands[kCOMPACT_flag])
+        printstats(commands)
+        exit(0)
+
+    if kEQUIV_flag in commands:
+        equal = runequiv(commands)
+        printstats(commands)
+        exit(0 if equal else 1)
+
+    if kSCAN_flag in commands:
+        # build the search automaton once, then one pass over the tape
+        runscan(batchmachine(commands), commands)
+        printstats(commands)
+        exit(0)
+
     if kNFAL_flag in commands:
-        M = machine.NFAlambda(commands[kNFAL_flag])
+        M = machine.NFAlambda(commands[kNFAL_flag], stats=commands.get(kSTATS_flag))
         print("T-Table:")
         print(M.dumps_ttable())
         if kCONV_flag in commands:
-            Mprime = M.convert()
+            Mprime = minimize(M.convert(), commands)
             Mprime.export(commands[kCONV_flag])
+            print("DFA States Generated: ", M.convert_report[machine.kREPORT_GENERATED])
             print("DFA Configuration:")
             print(Mprime.dumps())
-            Mprime.load(machine.Tape(commands[kTAPE_flag]))
-            try:
-                computation = Mprime.exec()
-                print("Accepted: ", computation["accepted"])
-                print("Tape: ", computation["tape"])
-                print("Machine Execution:")
-                print(computation["output"])
-            except machine.InvalidCharacterInTape as e:
-                print("Tape contains invalid character", *[str(x) for x in e.args])
-                print("Allowed characters: ", Mprime.alpha)
+            runtape(Mprime, commands)
+        else:
+            # run directly, DFA states are built as they are reached
+            runtape(M, commands)
     elif kDFA_flag in commands:
-        M = machine.DFA(commands[kDFA_flag])
-        M.load(machine.Tape(commands[kTAPE_flag]))
-        try:
-            computation = M.exec()
-            print("Accepted: ", computation["accepted"])
-            print("Tape: ", computation["tape"])
-            print("Machine Execution:")
-            print(computation["output"])
-        except machine.InvalidCharacterInTape as e:
-            print("Tape contains invalid character", *[str(x) for x in e.args])
-            print("Allowed characters: ", M.alpha)
+        M = minimize(machine.DFA(commands[kDFA_flag], stats=commands.get(kSTATS_flag)), commands)
+        runtape(M, commands)
 
+    printstats(commands)
     print("Run Complete - Exiting")
     exit(0)